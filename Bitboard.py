@@ -0,0 +1,357 @@
+import numpy
+
+from Pieces import *
+
+
+# ---------------------------------------------
+# BITBOARD REPRESENTATION
+#   - A board is a list of 20 ints, one per row,
+#     row 0 being the top of the board.
+#   - Bit x of a row is set when column x of
+#     that row is filled.
+# ---------------------------------------------
+FULL_ROW = (1 << 10) - 1
+
+# Number of set bits for every possible row
+POPCOUNT = [bin(row).count("1") for row in range(FULL_ROW + 1)]
+
+# Column weights used to pack a numpy board into rows
+COLUMN_BITS = 1 << numpy.arange(10)
+
+
+def build_piece_masks(piece_shape):
+    """
+    Precompute the row masks of every piece orientation in every column.
+
+    PARAMETERS
+    ----------
+    piece_shape : dict{string : numpy.array(float)}
+        numpy representation of each rotation for every piece
+
+    RETURNS
+    -------
+    piece_masks : dict{string : list[tuple(int)]}
+        for each orientation, a list indexed by column of the row masks of
+        the piece from its top row to its bottom row
+    """
+    piece_masks = {}
+    for key, piece in piece_shape.items():
+        rows = [int(numpy.dot(row > 0, COLUMN_BITS[:len(row)]))
+                for row in piece]
+        width = numpy.shape(piece)[1]
+        piece_masks[key] = [tuple(row << col for row in rows)
+                            for col in range(11 - width)]
+    return piece_masks
+
+
+PIECE_MASKS = build_piece_masks(PIECE_SHAPE)
+
+
+def to_bitboard(board):
+    """
+    Pack a numpy board into a bitboard.
+
+    PARAMETERS
+    ----------
+    board : numpy.array(float)
+        board containing game state
+
+    RETURNS
+    -------
+    rows : list[int]
+        one 10 bit integer per row
+    """
+    return [int(row) for row in (board > 0).dot(COLUMN_BITS)]
+
+
+def to_array(rows):
+    """
+    Unpack a bitboard into a numpy board.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        one 10 bit integer per row
+
+    RETURNS
+    -------
+    board : numpy.array(uint8)
+        board containing game state
+    """
+    packed = numpy.array(rows, dtype=numpy.int64)
+    return ((packed[:, None] & COLUMN_BITS) > 0).astype(numpy.uint8)
+
+
+def pack_bits(rows):
+    """
+    Pack a bitboard into a single 200 bit integer, e.g. to ship it to
+    another process.
+    """
+    packed = 0
+    for row in rows:
+        packed = (packed << 10) | row
+    return packed
+
+
+def unpack_bits(packed):
+    """
+    Unpack a bitboard packed by pack_bits.
+    """
+    return [(packed >> (10 * (19 - y))) & FULL_ROW for y in range(20)]
+
+
+def build_piece_packed(piece_masks):
+    """
+    Pack the row masks of every piece orientation in every column with the
+    piece at the top of the board. Shifting right by 10 * top moves the
+    piece down to board row top, so placing it on a packed board without
+    clearing rows is a single or.
+
+    RETURNS
+    -------
+    piece_packed : dict{string : list[int]}
+        for each orientation, a list indexed by column of the packed piece
+    """
+    return {key: [pack_bits(list(masks) + [0] * (20 - len(masks)))
+                  for masks in column_masks]
+            for key, column_masks in piece_masks.items()}
+
+
+PIECE_PACKED = build_piece_packed(PIECE_MASKS)
+
+
+def collides(rows, masks, top):
+    """
+    Check whether a piece overlaps the stack or the floor.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard
+
+    masks : tuple(int)
+        row masks of the piece in a given column
+
+    top : int
+        board row of the top of the piece
+
+    RETURNS
+    -------
+    collision : bool
+        True if the piece cannot sit at this row
+    """
+    if top + len(masks) > 20:
+        return True
+    for i, mask in enumerate(masks):
+        if rows[top + i] & mask:
+            return True
+    return False
+
+
+def drop(rows, masks, max_row=0):
+    """
+    Hard drop a piece and find the row it lands on.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard
+
+    masks : tuple(int)
+        row masks of the piece in a given column
+
+    max_row : int
+        highest filled row of the board, everything above is known to be
+        empty so the drop can start just above it
+
+    RETURNS
+    -------
+    top : int
+        board row of the top of the landed piece, -1 if the piece does not
+        fit on the board
+    """
+    top = max(max_row - len(masks), 0)
+    if collides(rows, masks, top):
+        return -1
+    while not collides(rows, masks, top + 1):
+        top += 1
+    return top
+
+
+def place(rows, masks, top):
+    """
+    Place a piece on a copy of the board.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard
+
+    masks : tuple(int)
+        row masks of the piece in a given column
+
+    top : int
+        board row of the top of the piece
+
+    RETURNS
+    -------
+    placed : list[int]
+        new bitboard containing the piece
+    """
+    placed = list(rows)
+    for i, mask in enumerate(masks):
+        placed[top + i] |= mask
+    return placed
+
+
+def rows_cleared_bits(rows):
+    """
+    Count the filled rows of a bitboard.
+    """
+    return rows.count(FULL_ROW)
+
+
+def clear_lines(rows):
+    """
+    Remove filled rows and shift everything above them down.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard
+
+    RETURNS
+    -------
+    cleared : list[int]
+        bitboard with the filled rows removed
+
+    clear_rows : int
+        number of rows removed
+    """
+    kept = [row for row in rows if row != FULL_ROW]
+    clear_rows = 20 - len(kept)
+    return [0] * clear_rows + kept, clear_rows
+
+
+def max_height_bits(rows):
+    """
+    Index of the highest filled row, 20 for an empty board.
+    """
+    for i, row in enumerate(rows):
+        if row:
+            return i
+    return 20
+
+
+def min_height_bits(rows):
+    """
+    Index of the top of the lowest column, 20 if any column is empty.
+    """
+    covered = 0
+    for i, row in enumerate(rows):
+        covered |= row
+        if covered == FULL_ROW:
+            return i
+    return 20
+
+
+def column_heights(rows):
+    """
+    Height of every column, measured from the floor.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard
+
+    RETURNS
+    -------
+    heights : list[int]
+        height of each column, 0 for an empty column
+    """
+    heights = [0] * 10
+    covered = 0
+    for i, row in enumerate(rows):
+        new = row & ~covered
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = 20 - i
+            new ^= low
+        covered |= row
+        if covered == FULL_ROW:
+            break
+    return heights
+
+
+def holes_bits(rows):
+    """
+    Count empty cells that have a filled cell somewhere above them.
+    """
+    holes = 0
+    covered = 0
+    for row in rows:
+        holes += POPCOUNT[covered & ~row & FULL_ROW]
+        covered |= row
+    return holes
+
+
+def roughness_bits(heights):
+    """
+    Sum of the height differences between neighbouring columns.
+    """
+    return sum(abs(heights[c] - heights[c + 1]) for c in range(9))
+
+
+def heuristic_bits(rows, weights):
+    """
+    Bitboard equivalent of Tetris_Game.calculate_heuristic.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard with the piece already placed
+
+    weights : list[float]
+        heuristic weights for height difference, holes, cleared rows and
+        roughness
+
+    RETURNS
+    -------
+    H : float
+        heuristic evaluation
+
+    cleared : list[int]
+        bitboard with the filled rows removed
+    """
+    cleared, clear_rows = clear_lines(rows)
+
+    # H(s) = - w0*D(s) - w1*O(s) + w2*C(s) - w3*R(s)
+    H = static_eval_bits(cleared, weights) + weights[2] * clear_rows
+
+    return H, cleared
+
+
+def static_eval_bits(rows, weights):
+    """
+    The board terms of the heuristic, i.e. everything but cleared rows.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard with filled rows already cleared
+
+    weights : list[float]
+        heuristic weights for height difference, holes, cleared rows and
+        roughness
+
+    RETURNS
+    -------
+    H : float
+        - w0*D(s) - w1*O(s) - w3*R(s)
+    """
+    height_diff = min_height_bits(rows) - max_height_bits(rows)
+    num_holes = holes_bits(rows)
+    roughness = roughness_bits(column_heights(rows))
+
+    return - weights[0] * height_diff - weights[1] * \
+        num_holes - weights[3] * roughness
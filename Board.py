@@ -1,5 +1,9 @@
 import numpy
 
+from Pieces import *
+from Bitboard import *
+from Transposition import *
+
 
 def rows_cleared(board, max_row):
     """
@@ -28,7 +32,7 @@ def clear_filled_rows(board):
     for i, row in enumerate(board):
         if numpy.sum(row) == 10:
             board = numpy.delete(board, i, 0)
-            board = numpy.vstack([numpy.zeros([1, 10]), board])
+            board = numpy.vstack([numpy.zeros([1, 10], board.dtype), board])
     return board
 
 
@@ -70,24 +74,194 @@ def get_roughness(board):
     return total_roughness
 
 
+def get_column_heights(board):
+    """
+    Height of every column, measured from the floor, 0 for an empty column.
+    """
+    filled = board > 0
+    return [int(h) for h in numpy.where(
+        filled.any(axis=0), 20 - filled.argmax(axis=0), 0)]
+
+
+def get_landing_row(column_heights, piece_key, col):
+    """
+    Find where a hard dropped piece lands from the column heights alone.
+
+    PARAMETERS
+    ----------
+    column_heights : list[int]
+        height of every column, see get_column_heights
+
+    piece_key : string
+        piece and orientation, e.g. "T0"
+
+    col : int
+        leftmost column of the piece
+
+    RETURNS
+    -------
+    valid_upper : int
+        board row of the top of the landed piece
+
+    valid_lower : int
+        board row just below the landed piece
+
+    found_valid : bool
+        whether the piece fits on the board
+    """
+    skirt = PIECE_SKIRT[piece_key]
+    bottom = max([column_heights[col + c] - skirt[c]
+                  for c in range(len(skirt))])
+    valid_lower = 20 - bottom
+    valid_upper = valid_lower - PIECE_HEIGHT[piece_key]
+    return valid_upper, valid_lower, valid_upper >= 0
+
+
+def clear_filled_rows_batch(boards):
+    """
+    Vectorised clear_filled_rows over a batch of boards.
+
+    PARAMETERS
+    ----------
+    boards : numpy.array(float)
+        (N, 20, 10) batch of boards
+
+    RETURNS
+    -------
+    cleared_boards : numpy.array(float)
+        (N, 20, 10) batch with filled rows removed and the rows above
+        shifted down
+
+    clear_rows : numpy.array(int)
+        number of rows cleared on each board
+    """
+    full = boards.sum(axis=2) == 10
+    # Stable sort moves the (emptied) filled rows to the top and keeps the
+    # order of the remaining rows
+    order = numpy.argsort(~full, axis=1, kind="stable")
+    emptied = boards * ~full[:, :, None]
+    cleared_boards = numpy.take_along_axis(emptied, order[:, :, None], axis=1)
+    return cleared_boards, full.sum(axis=1)
+
+
+def get_features_batch(boards):
+    """
+    Vectorised get_max_height, get_min_height, find_holes and get_roughness
+    over a batch of boards.
+
+    PARAMETERS
+    ----------
+    boards : numpy.array(float)
+        (N, 20, 10) batch of boards
+
+    RETURNS
+    -------
+    max_row : numpy.array(int)
+        index of the highest filled row of each board
+
+    min_row : numpy.array(int)
+        index of the top of the lowest column of each board
+
+    num_holes : numpy.array(int)
+        number of holes of each board
+
+    roughness : numpy.array(int)
+        roughness of each board
+    """
+    filled = boards > 0
+    top = numpy.where(filled.any(axis=1), filled.argmax(axis=1), 20)
+    heights = 20 - top
+
+    max_row = top.min(axis=1)
+    min_row = top.max(axis=1)
+    num_holes = (heights - filled.sum(axis=1)).sum(axis=1)
+    roughness = numpy.abs(numpy.diff(heights, axis=1)).sum(axis=1)
+    return max_row, min_row, num_holes, roughness
+
+
+class Undo_Frame:
+    """
+    Everything one Board.make() changed, so unmake() can restore it. Frames
+    are allocated once and reused, making a move copies into them.
+    """
+
+    __slots__ = ("upper", "col", "piece_key", "clear_rows", "full",
+                 "max_row", "min_row", "number_of_holes", "roughness",
+                 "hash", "column_heights", "column_fill", "column_holes",
+                 "row_fill")
+
+    def __init__(self):
+        self.upper = 0
+        self.col = 0
+        self.piece_key = ""
+        self.clear_rows = 0
+        self.full = [0] * 20
+        self.max_row = 20
+        self.min_row = 20
+        self.number_of_holes = 0
+        self.roughness = 0
+        self.hash = 0
+        self.column_heights = [0] * 10
+        self.column_fill = [0] * 10
+        self.column_holes = [0] * 10
+        self.row_fill = [0] * 20
+
+
 class Board:
     """
     Board Documentation
+
+    Besides the board itself, keeps the features the heuristic needs. They
+    are rebuilt from scratch by update() after a screenshot, and maintained
+    incrementally by place() and clear_filled() during search.
+
+    Search plays candidates with make() and takes them back with unmake(),
+    working on this board in place instead of on copies.
     """
 
     def __init__(self):
         """
         Board init documentation
         """
-        self.board = numpy.zeros((20, 10))
+        self.board = numpy.zeros((20, 10), dtype=numpy.uint8)
         self.max_row = 20
         self.min_row = 20
         self.number_of_holes = 0
+        self.column_heights = [0] * 10
+        self.hash = 0
+        self.column_fill = [0] * 10
+        self.column_holes = [0] * 10
+        self.row_fill = [0] * 20
+        self.roughness = 0
+        self.undo_stack = []
+        self.undo_depth = 0
+
+    def copy(self):
+        """
+        Copy the board and its features.
+        """
+        new = Board.__new__(Board)
+        new.board = numpy.copy(self.board)
+        new.max_row = self.max_row
+        new.min_row = self.min_row
+        new.number_of_holes = self.number_of_holes
+        new.column_heights = list(self.column_heights)
+        new.hash = self.hash
+        new.column_fill = list(self.column_fill)
+        new.column_holes = list(self.column_holes)
+        new.row_fill = list(self.row_fill)
+        new.roughness = self.roughness
+        new.undo_stack = []
+        new.undo_depth = 0
+        return new
 
     def update_state(self, y, x, new_val):
         """
         Board update documentation
         """
+        # Toggle the cell in the Zobrist hash if it changes occupancy
+        if (self.board[y, x] > 0) != (new_val > 0):
+            self.hash ^= ZOBRIST_CELL[y][x]
         self.board[y, x] = new_val
 
     def update(self):
@@ -98,3 +272,254 @@ class Board:
         self.max_row = get_max_height(self.board)
         self.min_row = get_min_height(self.board)
         self.number_of_holes = find_holes(self.board)
+        self.column_heights = get_column_heights(self.board)
+        self.hash = zobrist_board(self.board)
+
+        filled = self.board > 0
+        self.column_fill = [int(n) for n in filled.sum(axis=0)]
+        self.row_fill = [int(n) for n in filled.sum(axis=1)]
+        self.column_holes = [h - n for h, n in
+                             zip(self.column_heights, self.column_fill)]
+        self.roughness = sum(
+            abs(self.column_heights[c] - self.column_heights[c + 1])
+            for c in range(9))
+
+    def place(self, upper, col, piece_key):
+        """
+        Place a piece and update the features of the columns it covers.
+
+        PARAMETERS
+        ----------
+        upper : int
+            board row of the top of the piece
+
+        col : int
+            leftmost column of the piece
+
+        piece_key : string
+            piece and orientation, e.g. "T0"
+
+        RETURNS
+        -------
+        None
+        """
+        heights = self.column_heights
+        width = len(PIECE_SKIRT[piece_key])
+        left = max(col - 1, 0)
+        right = min(col + width, 9)
+
+        old_roughness = sum(abs(heights[c] - heights[c + 1])
+                            for c in range(left, right))
+
+        for y, x in PIECE_CELLS[piece_key]:
+            y += upper
+            x += col
+            self.board[y, x] = 1
+            self.hash ^= ZOBRIST_CELL[y][x]
+            self.row_fill[y] += 1
+            self.column_fill[x] += 1
+            if 20 - y > heights[x]:
+                heights[x] = 20 - y
+
+        for c in range(col, col + width):
+            holes = heights[c] - self.column_fill[c]
+            self.number_of_holes += holes - self.column_holes[c]
+            self.column_holes[c] = holes
+
+        self.roughness += sum(abs(heights[c] - heights[c + 1])
+                              for c in range(left, right)) - old_roughness
+        self.max_row = min(self.max_row, upper)
+        self.min_row = 20 - min(heights)
+
+    def clear_filled(self):
+        """
+        Clear filled rows, shifting the rows above down.
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        clear_rows : int
+            number of rows cleared
+        """
+        row_fill = self.row_fill
+        first_full = 20
+        clear_rows = 0
+        for y in range(self.max_row, 20):
+            if row_fill[y] == 10:
+                if clear_rows == 0:
+                    first_full = y
+                clear_rows += 1
+        if clear_rows == 0:
+            return 0
+
+        # Shift the kept rows down in place, rows above max_row are empty.
+        # The hash loses every cleared row and moves every shifted one
+        masks = (self.board[self.max_row:] > 0).dot(COLUMN_BITS)
+        key = self.hash
+        target = 19
+        for y in range(19, self.max_row - 1, -1):
+            if row_fill[y] != 10:
+                if target != y:
+                    mask = int(masks[y - self.max_row])
+                    key ^= ZOBRIST_ROW[y][mask] ^ ZOBRIST_ROW[target][mask]
+                    self.board[target] = self.board[y]
+                    row_fill[target] = row_fill[y]
+                target -= 1
+            else:
+                key ^= ZOBRIST_ROW[y][FULL_ROW]
+        self.board[self.max_row:target + 1] = 0
+        for y in range(self.max_row, target + 1):
+            row_fill[y] = 0
+        self.hash = key
+
+        # A column whose top survives drops by the number of cleared rows,
+        # one whose top was in the highest cleared row is rescanned
+        heights = self.column_heights
+        for c in range(10):
+            self.column_fill[c] -= clear_rows
+            if 20 - heights[c] < first_full:
+                heights[c] -= clear_rows
+            else:
+                filled = self.board[:, c] > 0
+                if filled.any():
+                    heights[c] = 20 - int(filled.argmax())
+                else:
+                    heights[c] = 0
+            self.column_holes[c] = heights[c] - self.column_fill[c]
+
+        self.number_of_holes = sum(self.column_holes)
+        self.roughness = sum(abs(heights[c] - heights[c + 1])
+                             for c in range(9))
+        self.max_row = 20 - max(heights)
+        self.min_row = 20 - min(heights)
+        return clear_rows
+
+    def make(self, upper, col, piece_key):
+        """
+        Place a piece and clear filled rows, recording what changed so
+        unmake() can take the move back.
+
+        PARAMETERS
+        ----------
+        upper : int
+            board row of the top of the piece
+
+        col : int
+            leftmost column of the piece
+
+        piece_key : string
+            piece and orientation, e.g. "T0"
+
+        RETURNS
+        -------
+        clear_rows : int
+            number of rows cleared
+        """
+        if self.undo_depth == len(self.undo_stack):
+            self.undo_stack.append(Undo_Frame())
+        frame = self.undo_stack[self.undo_depth]
+        self.undo_depth += 1
+
+        frame.upper = upper
+        frame.col = col
+        frame.piece_key = piece_key
+        frame.max_row = self.max_row
+        frame.min_row = self.min_row
+        frame.number_of_holes = self.number_of_holes
+        frame.roughness = self.roughness
+        frame.hash = self.hash
+        frame.column_heights[:] = self.column_heights
+        frame.column_fill[:] = self.column_fill
+        frame.column_holes[:] = self.column_holes
+        frame.row_fill[:] = self.row_fill
+
+        self.place(upper, col, piece_key)
+
+        # Remember which rows fill up, clear_filled() removes them
+        clear_rows = 0
+        for y in range(self.max_row, 20):
+            if self.row_fill[y] == 10:
+                frame.full[clear_rows] = y
+                clear_rows += 1
+        frame.clear_rows = clear_rows
+        if clear_rows > 0:
+            self.clear_filled()
+        return clear_rows
+
+    def unmake(self):
+        """
+        Take back the last make().
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        None
+        """
+        self.undo_depth -= 1
+        frame = self.undo_stack[self.undo_depth]
+
+        # Put the cleared rows back, moving the kept rows up. Reading top
+        # down never reads a row that was already written
+        if frame.clear_rows > 0:
+            full = frame.full
+            top = min(frame.max_row, frame.upper)
+            j = 0
+            src = top + frame.clear_rows
+            for y in range(top, 20):
+                if j < frame.clear_rows and full[j] == y:
+                    self.board[y] = 1
+                    j += 1
+                else:
+                    self.board[y] = self.board[src]
+                    src += 1
+
+        for y, x in PIECE_CELLS[frame.piece_key]:
+            self.board[frame.upper + y, frame.col + x] = 0
+
+        self.max_row = frame.max_row
+        self.min_row = frame.min_row
+        self.number_of_holes = frame.number_of_holes
+        self.roughness = frame.roughness
+        self.hash = frame.hash
+        self.column_heights[:] = frame.column_heights
+        self.column_fill[:] = frame.column_fill
+        self.column_holes[:] = frame.column_holes
+        self.row_fill[:] = frame.row_fill
+
+    def clear_undo(self):
+        """
+        Keep the moves made so far, they can no longer be taken back.
+        """
+        self.undo_depth = 0
+
+    def verify(self):
+        """
+        Check the incrementally maintained features against a full rescan
+        of the board.
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        valid : bool
+            True if every feature matches the rescan
+        """
+        rescan = self.copy()
+        rescan.update()
+        return (self.max_row == rescan.max_row
+                and self.min_row == rescan.min_row
+                and self.number_of_holes == rescan.number_of_holes
+                and self.column_heights == rescan.column_heights
+                and self.hash == rescan.hash
+                and self.column_fill == rescan.column_fill
+                and self.column_holes == rescan.column_holes
+                and self.row_fill == rescan.row_fill
+                and self.roughness == get_roughness(self.board))
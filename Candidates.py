@@ -0,0 +1,236 @@
+from Board import get_landing_row
+from Pieces import *
+
+
+# ---------------------------------------------
+# CANDIDATE GENERATION
+#   - Every piece shape is listed once in
+#     PIECE_SHAPE, so two candidates fill the
+#     same cells exactly when they place the
+#     same orientation of the same piece in the
+#     same column, e.g. when the hold piece is
+#     the current piece.
+#   - Such duplicates are played with the same
+#     key presses apart from the hold key, so
+#     the move without holding is the cheapest.
+# ---------------------------------------------
+def unique_options(options):
+    """
+    Drop the options that play the same piece to the same outcome as
+    another one, keeping the cheapest.
+
+    PARAMETERS
+    ----------
+    options : iterable of tuple(bool, string, object)
+        (hold_select, piece, outcome) of every way to play the next piece.
+        outcome is whatever the move leaves besides the board, e.g. the
+        new hold piece, or None when only the board matters
+
+    RETURNS
+    -------
+    options : list[tuple(bool, string, object)]
+        unique options in the order of their first occurrence
+    """
+    cheapest = {}
+    for hold_select, piece, outcome in options:
+        key = (piece, outcome)
+        if key not in cheapest or cheapest[key] > hold_select:
+            cheapest[key] = hold_select
+    return [(hold_select, piece, outcome)
+            for (piece, outcome), hold_select in cheapest.items()]
+
+
+def unique_candidates(column_heights, options):
+    """
+    Generate every placement of the options that lands on the board, each
+    unique placement once.
+
+    PARAMETERS
+    ----------
+    column_heights : list[int]
+        height of every column, see get_column_heights
+
+    options : iterable of tuple(bool, string, object)
+        (hold_select, piece, outcome) of every way to play the next piece,
+        see unique_options
+
+    RETURNS
+    -------
+    generator of (hold_select, orientation, piece_key, col, upper, outcome)
+        candidates in the order evaluate() visits them, tagged with the
+        cheapest way to play them. upper is the board row of the top of
+        the landed piece
+    """
+    for hold_select, piece, outcome in unique_options(options):
+        for states, piece_key in enumerate(PIECE_KEYS[piece]):
+            for col in range(11 - len(PIECE_SKIRT[piece_key])):
+                upper, _, found_valid = get_landing_row(
+                    column_heights, piece_key, col)
+                if found_valid:
+                    yield hold_select, states, piece_key, col, upper, outcome
+
+
+# ---------------------------------------------
+# OPTIMISTIC BOUNDS
+#   - When no row is cleared, the holes after a
+#     placement are the holes before plus the
+#     gaps left under the skirt of the piece.
+#     Clearing rows can uncover holes, so then
+#     only 0 holes is certain.
+#   - With holes and cleared rows known, H can
+#     only fall below
+#       - w1*holes + w2*cleared rows
+#     through the height difference and
+#     roughness terms, which are never negative.
+#   - Boards that already have a full row clear
+#     it with any placement, the bounds assume
+#     they have none.
+# ---------------------------------------------
+
+# Number of cells of every row of an orientation, top row first
+PIECE_ROW_CELLS = {
+    piece_key: tuple(sum(1 for y, _ in cells if y == row)
+                     for row in range(PIECE_HEIGHT[piece_key]))
+    for piece_key, cells in PIECE_CELLS.items()}
+
+
+def bounds_valid(weights):
+    """
+    Whether optimistic_bound() is an upper bound of H for the weights,
+    i.e. the height difference and roughness are never rewarded.
+    """
+    return weights[0] >= 0 and weights[3] >= 0
+
+
+def holes_after(holes, column_heights, piece_key, col, upper):
+    """
+    Number of holes once a piece is placed, before filled rows are
+    cleared.
+
+    PARAMETERS
+    ----------
+    holes : int
+        number of holes before the placement
+
+    column_heights : list[int]
+        height of every column before the placement
+
+    piece_key : string
+        piece and orientation, e.g. "T0"
+
+    col : int
+        leftmost column of the piece
+
+    upper : int
+        board row of the top of the landed piece
+
+    RETURNS
+    -------
+    holes : int
+        holes before plus the empty cells left under the piece
+    """
+    bottom = 20 - upper - PIECE_HEIGHT[piece_key]
+    for c, skirt in enumerate(PIECE_SKIRT[piece_key]):
+        holes += bottom + skirt - column_heights[col + c]
+    return holes
+
+
+def rows_completed(row_fill, piece_key, upper):
+    """
+    Number of rows a piece fills up, from the filled cells of every row.
+    """
+    clear_rows = 0
+    for y, cells in enumerate(PIECE_ROW_CELLS[piece_key]):
+        if row_fill[upper + y] + cells == 10:
+            clear_rows += 1
+    return clear_rows
+
+
+def optimistic_bound(holes, clear_rows, weights):
+    """
+    Highest H a placement can have with these holes, see holes_after, and
+    cleared rows.
+    """
+    if clear_rows > 0:
+        holes = 0
+    return - weights[1] * holes + weights[2] * clear_rows
+
+
+def placement_bound(holes, column_heights, row_fill, piece_key, col, upper,
+                    weights):
+    """
+    optimistic_bound() of a placement from the features of the board
+    before it.
+
+    PARAMETERS
+    ----------
+    holes : int
+        number of holes of the board
+
+    column_heights : list[int]
+        height of every column
+
+    row_fill : list[int]
+        number of filled cells of every row
+
+    piece_key : string
+        piece and orientation, e.g. "T0"
+
+    col : int
+        leftmost column of the piece
+
+    upper : int
+        board row of the top of the landed piece
+
+    weights : list[float]
+        heuristic weights
+
+    RETURNS
+    -------
+    bound : float
+        highest H the placement can have
+    """
+    return optimistic_bound(
+        holes_after(holes, column_heights, piece_key, col, upper),
+        rows_completed(row_fill, piece_key, upper), weights)
+
+
+class Prune_Stats:
+    """
+    Counts of candidates cut by their optimistic bound.
+
+    ATTRIBUTES
+    ----------
+    candidates : int
+        number of candidates generated
+
+    pruned : int
+        number of candidates cut before the full heuristic
+
+    METHODS
+    -------
+    summary():
+        one line report of the counts
+
+    clear():
+        reset the counts
+    """
+
+    def __init__(self):
+        self.candidates = 0
+        self.pruned = 0
+
+    def summary(self):
+        """
+        One line report of the counts.
+        """
+        share = self.pruned / max(self.candidates, 1)
+        return (f"Pruned {self.pruned} of {self.candidates} candidates "
+                f"({share:.1%}) before the full heuristic")
+
+    def clear(self):
+        """
+        Reset the counts.
+        """
+        self.candidates = 0
+        self.pruned = 0
@@ -0,0 +1,217 @@
+import threading
+from time import perf_counter
+from time import sleep
+
+import mss
+import numpy
+
+from Frame_Decoder import *
+from Instrumentation import *
+
+
+class Capture_Service:
+    """
+    Captures and decodes the screen on a background thread so the main
+    loop never waits for a screenshot.
+
+    Frames are copied into a ring of preallocated buffers. Every decoded
+    frame is published with an increasing sequence number, readers take
+    the latest one without blocking or wait for a newer one.
+
+    ATTRIBUTES
+    ----------
+    monitor : dict{string : int}
+        section of screen to screenshot
+
+    decoder : Frame_Decoder object
+        reads the game state from a frame
+
+    rate : float
+        captures per second, 0 captures as fast as possible
+
+    frames : numpy.array(uint8)
+        (slots, height, width, 4) ring of BGRA frames
+
+    sequence : int
+        sequence number of the latest published state, 0 before the first
+
+    state : tuple
+        (board, hold_piece, current_piece, queue) of the latest frame
+
+    decode_errors : int
+        number of frames with colours that match no piece, e.g. mid
+        animation
+
+    thread : Thread
+        capture thread, None when stopped
+
+    timers : Stage_Timer object
+        records the "capture" and "decode" of every frame
+
+    METHODS
+    -------
+    start():
+        start the capture thread
+
+    stop():
+        stop the capture thread
+
+    latest():
+        latest sequence number and state, without blocking
+
+    wait_newer():
+        wait for a state newer than a given sequence number
+
+    frame():
+        frame of a sequence number, if still in the ring
+    """
+
+    def __init__(self, monitor, decoder, rate=0, slots=4, timers=None):
+        """
+        PARAMETERS
+        ----------
+        monitor : dict{string : int}
+            section of screen to screenshot
+
+        decoder : Frame_Decoder object
+            reads the game state from a frame
+
+        rate : float
+            captures per second, 0 captures as fast as possible
+
+        slots : int
+            number of frames kept in the ring
+
+        timers : Stage_Timer object or None
+            stage latencies, disabled if None
+        """
+        self.monitor = monitor
+        self.decoder = decoder
+        self.rate = rate
+        self.timers = timers if timers is not None else Stage_Timer()
+
+        self.frames = numpy.zeros(
+            (slots, monitor["height"], monitor["width"], 4), dtype=numpy.uint8)
+        self.sequence = 0
+        self.state = None
+        self.decode_errors = 0
+
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """
+        Start the capture thread.
+        """
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the capture thread and wait for it to finish.
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        """
+        Capture loop. mss instances cannot be shared between threads, so
+        the thread creates its own.
+        """
+        slots = len(self.frames)
+        interval = 1 / self.rate if self.rate > 0 else 0
+
+        with mss.mss() as sct:
+            tic = perf_counter()
+            while self.running:
+                # The slot being written is never the latest published one
+                frame = self.frames[(self.sequence + 1) % slots]
+                stage_tic = self.timers.tic()
+                numpy.copyto(frame, frame_view(sct.grab(self.monitor)))
+                self.timers.toc("capture", stage_tic)
+
+                stage_tic = self.timers.tic()
+                state = self.decoder.decode(frame)
+                self.timers.toc("decode", stage_tic)
+                if UNKNOWN_PIECE in [state[2]] + state[3]:
+                    self.decode_errors += 1
+                else:
+                    with self.condition:
+                        self.sequence += 1
+                        self.state = state
+                        self.condition.notify_all()
+
+                if interval > 0:
+                    tic += interval
+                    delay = tic - perf_counter()
+                    if delay > 0:
+                        sleep(delay)
+                    else:
+                        tic = perf_counter()
+
+    def latest(self):
+        """
+        Latest published state, without blocking.
+
+        RETURNS
+        -------
+        sequence : int
+            sequence number of the state, 0 when nothing is published yet
+
+        state : tuple or None
+            (board, hold_piece, current_piece, queue)
+        """
+        with self.condition:
+            return self.sequence, self.state
+
+    def wait_newer(self, sequence, timeout=None):
+        """
+        Wait for a state newer than sequence.
+
+        PARAMETERS
+        ----------
+        sequence : int
+            sequence number already seen
+
+        timeout : float or None
+            seconds to wait at most
+
+        RETURNS
+        -------
+        sequence : int
+            sequence number of the latest state, unchanged on timeout
+
+        state : tuple or None
+            (board, hold_piece, current_piece, queue)
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.sequence > sequence, timeout)
+            return self.sequence, self.state
+
+    def frame(self, sequence):
+        """
+        Frame a state was decoded from.
+
+        PARAMETERS
+        ----------
+        sequence : int
+            sequence number of the state
+
+        RETURNS
+        -------
+        frame : numpy.array(uint8) or None
+            copy of the (height, width, 4) BGRA frame, None once it has
+            been overwritten
+        """
+        with self.condition:
+            # The slot after the latest one may be being written
+            if not 0 < self.sequence - sequence + 1 < len(self.frames):
+                return None
+            return numpy.copy(self.frames[sequence % len(self.frames)])
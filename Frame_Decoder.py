@@ -0,0 +1,282 @@
+import numpy
+
+from Pieces import *
+
+
+# ---------------------------------------------
+# PIXEL LAYOUT
+#   - (x, y) positions sampled in the
+#     monitor_full_board screenshot.
+# ---------------------------------------------
+BOARD_PIXELS = [(207 + 36 * x, 127 + 36 * y)
+                for y in range(20) for x in range(10)]
+HOLD_PIXEL = (98, 199)
+CURRENT_PIXEL = (356, 38)
+QUEUE_PIXELS = [(650, 199 + 109 * i) for i in range(5)]
+
+# Board cells brighter than this are filled
+BOARD_THRESHOLD = 40
+
+# Hold pieces darker than this were just held and cannot be used
+HOLD_USED_THRESHOLD = 90
+
+
+# ---------------------------------------------
+# PIECE COLOURS
+#   - Greyscale value of each piece in the hold,
+#     current piece and queue, the later values
+#     are the brighter current piece.
+# ---------------------------------------------
+PIECE_COLOUR = {
+    166: "S", 165: "S", 136: "L", 152: "I", 153: "I", 170: "O", 171: "O",
+    121: "T", 99: "J", 98: "J", 110: "Z", 109: "Z",
+    218: "S", 180: "L", 200: "I", 220: "O", 161: "T", 131: "J", 145: "Z"}
+
+# Greyscale levels this close to a known colour are that piece
+COLOUR_TOLERANCE = 3
+
+
+def frame_view(frame):
+    """
+    View a screenshot as a numpy array without copying it.
+
+    PARAMETERS
+    ----------
+    frame : mss ScreenShot or numpy.array(uint8)
+        screenshot, or a synthetic (height, width, 4) BGRA or
+        (height, width) greyscale frame
+
+    RETURNS
+    -------
+    pixels : numpy.array(uint8)
+        (height, width, 4) BGRA or (height, width) greyscale view
+    """
+    if isinstance(frame, numpy.ndarray):
+        return frame
+    return numpy.frombuffer(frame.raw, dtype=numpy.uint8).reshape(
+        frame.height, frame.width, 4)
+
+
+def greyscale(bgra):
+    """
+    Convert BGRA pixels to greyscale exactly like PIL's "L" conversion.
+
+    PARAMETERS
+    ----------
+    bgra : numpy.array(uint8)
+        (..., 4) BGRA pixels
+
+    RETURNS
+    -------
+    grey : numpy.array(int)
+        greyscale value of every pixel
+    """
+    bgra = bgra.astype(numpy.int32)
+    return (bgra[..., 2] * 19595 + bgra[..., 1] * 38470 +
+            bgra[..., 0] * 7471 + 0x8000) >> 16
+
+
+def build_piece_lut(piece_colour, tolerance):
+    """
+    Lookup table from greyscale level to piece code.
+
+    Every level within tolerance of a known colour maps to the nearest
+    one. Levels equally near two different pieces and levels far from
+    every colour are unknown, black is no piece.
+
+    PARAMETERS
+    ----------
+    piece_colour : dict{int : string}
+        converts greyscale colour to corresponding piece
+
+    tolerance : int
+        largest distance from a known colour that is still matched
+
+    RETURNS
+    -------
+    lut : numpy.array(uint8)
+        piece code of each of the 256 greyscale levels
+    """
+    lut = numpy.full(256, PIECE_CODE[UNKNOWN_PIECE], dtype=numpy.uint8)
+    distance = numpy.full(256, tolerance + 1)
+    for colour, piece in piece_colour.items():
+        for level in range(max(colour - tolerance, 0),
+                           min(colour + tolerance, 255) + 1):
+            d = abs(level - colour)
+            if d < distance[level]:
+                lut[level] = PIECE_CODE[piece]
+                distance[level] = d
+            elif d == distance[level] and lut[level] != PIECE_CODE[piece]:
+                lut[level] = PIECE_CODE[UNKNOWN_PIECE]
+    lut[0] = PIECE_CODE[""]
+    return lut
+
+
+def build_hold_lut(piece_lut):
+    """
+    Lookup table from greyscale level to hold piece code, dark pieces were
+    just held and cannot be used.
+    """
+    lut = numpy.copy(piece_lut)
+    lut[1:HOLD_USED_THRESHOLD] = PIECE_CODE["U"]
+    return lut
+
+
+class Frame_Decoder:
+    """
+    Decodes the game state from a screenshot by sampling every pixel it
+    needs in one gather.
+
+    ATTRIBUTES
+    ----------
+    piece_colour : dict{int : string}
+        converts greyscale colour to corresponding piece
+
+    luts : numpy.array(uint8)
+        (2, 256) piece code of each greyscale level, for the current
+        piece and queue in row 0 and for the hold in row 1
+
+    kinds : numpy.array(int)
+        row of luts for each of the hold, current and queue pixels
+
+    ys : numpy.array(int)
+        rows of the sampled pixels: board cells, hold, current, queue
+
+    xs : numpy.array(int)
+        columns of the sampled pixels
+
+    METHODS
+    -------
+    sample():
+        greyscale values of every sampled pixel
+
+    classify():
+        pieces of greyscale values
+
+    decode():
+        board, hold, current piece and queue of a frame
+
+    decode_queue():
+        queue of a frame
+    """
+
+    def __init__(self, piece_colour=PIECE_COLOUR,
+                 tolerance=COLOUR_TOLERANCE):
+        """
+        PARAMETERS
+        ----------
+        piece_colour : dict{int : string}
+            converts greyscale colour to corresponding piece
+
+        tolerance : int
+            largest distance from a known colour that is still matched
+        """
+        self.piece_colour = piece_colour
+
+        piece_lut = build_piece_lut(piece_colour, tolerance)
+        self.luts = numpy.stack([piece_lut, build_hold_lut(piece_lut)])
+        self.kinds = numpy.array([1] + [0] * (1 + len(QUEUE_PIXELS)))
+
+        pixels = BOARD_PIXELS + [HOLD_PIXEL, CURRENT_PIXEL] + QUEUE_PIXELS
+        self.xs = numpy.array([x for x, y in pixels])
+        self.ys = numpy.array([y for x, y in pixels])
+
+    def sample(self, frame, start=0, stop=None):
+        """
+        Greyscale values of the sampled pixels.
+
+        PARAMETERS
+        ----------
+        frame : mss ScreenShot or numpy.array(uint8)
+            screenshot or synthetic frame
+
+        start, stop : int
+            slice of the sampled pixels to read
+
+        RETURNS
+        -------
+        grey : numpy.array(int)
+            greyscale value of every sampled pixel
+        """
+        pixels = frame_view(frame)[self.ys[start:stop], self.xs[start:stop]]
+        if pixels.ndim == 1:
+            return pixels.astype(numpy.int32)
+        return greyscale(pixels)
+
+    def classify(self, grey):
+        """
+        Pieces of greyscale current piece or queue pixels, "?" for
+        unknown colours.
+
+        PARAMETERS
+        ----------
+        grey : numpy.array(int)
+            greyscale values
+
+        RETURNS
+        -------
+        pieces : list[string]
+            piece of every value
+        """
+        return [PIECE_NAMES[code] for code in self.luts[0, grey].tolist()]
+
+    def classify_hold(self, hold_pix):
+        """
+        Piece in hold, "" when empty and "U" when just held.
+        """
+        return PIECE_NAMES[self.luts[1, hold_pix]]
+
+    def decode(self, frame):
+        """
+        Decode the full game state.
+
+        PARAMETERS
+        ----------
+        frame : mss ScreenShot or numpy.array(uint8)
+            screenshot or synthetic frame
+
+        RETURNS
+        -------
+        board : numpy.array(uint8)
+            board containing game state
+
+        hold_piece : string
+            piece that is currently being held
+
+        current_piece : string
+            piece that is about to be placed, "" if none
+
+        queue : list[string]
+            upcoming five pieces
+
+        Colours that match no piece decode as "?".
+        """
+        grey = self.sample(frame)
+
+        board = (grey[:200] > BOARD_THRESHOLD).astype(
+            numpy.uint8).reshape(20, 10)
+
+        # Hold, current piece and queue in one lookup
+        pieces = [PIECE_NAMES[code]
+                  for code in self.luts[self.kinds, grey[200:]].tolist()]
+        hold_piece = pieces[0]
+        current_piece = pieces[1]
+        queue = pieces[2:]
+
+        return board, hold_piece, current_piece, queue
+
+    def decode_queue(self, frame):
+        """
+        Decode only the queue.
+
+        PARAMETERS
+        ----------
+        frame : mss ScreenShot or numpy.array(uint8)
+            screenshot or synthetic frame
+
+        RETURNS
+        -------
+        queue : list[string]
+            upcoming five pieces
+        """
+        return self.classify(self.sample(frame, 202))
@@ -0,0 +1,486 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections import namedtuple
+from queue import Queue
+from time import time
+
+import numpy
+
+from Bitboard import *
+from Frame_Decoder import *
+from Game_State import *
+
+
+# ---------------------------------------------
+# BINARY LOG FORMAT
+#   - LOG_MAGIC, then fixed size records so
+#     record i starts at
+#     len(LOG_MAGIC) + i * RECORD.size.
+#   - Record fields, little endian:
+#       piece number         uint32
+#       timestamp            float64, time()
+#       board                25 bytes, pack_bits
+#       current, hold        uint8 piece codes
+#       queue                5 uint8 piece codes
+#       orientation, col,    int8 each, -1 when
+#       hold_select            no move was made
+#       decision time        float32 seconds
+#   - Piece codes index PIECE_NAMES.
+# ---------------------------------------------
+LOG_MAGIC = b"CTETLOG1"
+RECORD = struct.Struct("<Id25sBB5sbbbf")
+BOARD_BYTES = 25
+NO_MOVE = (-1, -1, -1)
+
+# RECORD as a numpy dtype, for reading many records at once
+RECORD_DTYPE = numpy.dtype([
+    ("piece_number", "<u4"), ("timestamp", "<f8"),
+    ("board", "u1", BOARD_BYTES), ("current", "u1"), ("hold", "u1"),
+    ("queue", "u1", 5), ("orientation", "i1"), ("col", "i1"),
+    ("hold_select", "i1"), ("decision_time", "<f4")])
+
+Log_Record = namedtuple(
+    "Log_Record",
+    ["piece_number", "timestamp", "board", "current_piece", "hold_piece",
+     "queue", "move", "decision_time"])
+
+
+def pack_board(board):
+    """
+    Pack a numpy board into 25 bytes.
+    """
+    return pack_bits(to_bitboard(board)).to_bytes(BOARD_BYTES, "big")
+
+
+def unpack_board(data):
+    """
+    Unpack a board packed by pack_board into a numpy board.
+    """
+    return to_array(unpack_bits(int.from_bytes(data, "big")))
+
+
+def snapshot(game):
+    """
+    Packed state of a Tetris_Game, taken before evaluate() changes it.
+
+    PARAMETERS
+    ----------
+    game : Tetris_Game object
+        game to log
+
+    RETURNS
+    -------
+    state : Game_State
+        board and pieces of the game
+    """
+    return Game_State.from_game(game)
+
+
+def pack_record(piece_number, state, move=None, decision_time=0,
+                timestamp=None):
+    """
+    Pack one record.
+
+    PARAMETERS
+    ----------
+    piece_number : int
+        number of the piece in the game
+
+    state : Game_State
+        state returned by snapshot()
+
+    move : tuple(int, int, bool) or None
+        (orientation, col, hold_select) chosen for the state
+
+    decision_time : float
+        seconds evaluate() took
+
+    timestamp : float or None
+        time() of the record, defaults to now
+
+    RETURNS
+    -------
+    data : bytes
+        RECORD.size bytes
+    """
+    if move is None:
+        move = NO_MOVE
+    if timestamp is None:
+        timestamp = time()
+    return RECORD.pack(piece_number, timestamp,
+                       state.board.to_bytes(BOARD_BYTES, "big"),
+                       state.current, state.hold, bytes(state.queue),
+                       move[0], move[1], int(move[2]), decision_time)
+
+
+def unpack_record(data, offset=0):
+    """
+    Unpack one record.
+
+    PARAMETERS
+    ----------
+    data : bytes-like
+        buffer holding the record
+
+    offset : int
+        position of the record in data
+
+    RETURNS
+    -------
+    record : Log_Record
+        the move is None when none was made
+    """
+    (piece_number, timestamp, board, current, hold, queue_codes,
+     orientation, col, hold_select, decision_time) = \
+        RECORD.unpack_from(data, offset)
+    move = (orientation, col, bool(hold_select))
+    if orientation < 0:
+        move = None
+    return Log_Record(piece_number, timestamp, unpack_board(board),
+                      PIECE_NAMES[current], PIECE_NAMES[hold],
+                      [PIECE_NAMES[code] for code in queue_codes],
+                      move, decision_time)
+
+
+class Game_Log_Writer:
+    """
+    Writes binary log records on a background thread so logging never
+    waits for the disk.
+
+    ATTRIBUTES
+    ----------
+    path : string
+        file the log is written to
+
+    records : Queue
+        packed records waiting to be written, None stops the writer
+
+    flush_every : int
+        records written between flushes
+
+    written : int
+        number of records written
+
+    METHODS
+    -------
+    write():
+        queue a record
+
+    close():
+        write the queued records and close the file
+    """
+
+    def __init__(self, path, flush_every=64, buffer_size=1 << 16):
+        """
+        PARAMETERS
+        ----------
+        path : string
+            file the log is written to, overwritten if it exists
+
+        flush_every : int
+            records written between flushes
+
+        buffer_size : int
+            size of the file buffer in bytes
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.written = 0
+
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.file.write(LOG_MAGIC)
+
+        self.records = Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, piece_number, state, move=None, decision_time=0):
+        """
+        Queue a record, see pack_record().
+        """
+        self.records.put(pack_record(piece_number, state, move,
+                                     decision_time))
+
+    def run(self):
+        """
+        Writer loop.
+        """
+        while True:
+            data = self.records.get()
+            if data is None:
+                break
+            self.file.write(data)
+            self.written += 1
+            if self.written % self.flush_every == 0:
+                self.file.flush()
+        self.file.close()
+
+    def close(self):
+        """
+        Write the queued records and close the file.
+        """
+        if self.thread is not None:
+            self.records.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+# ---------------------------------------------
+# TEXT LOG CONVERSION
+#   - Old debug/log.txt lines are
+#     "n,200 cells,current,hold,5 queue,n" with
+#     "-" for an empty hold.
+# ---------------------------------------------
+def parse_text_record(line):
+    """
+    Parse one line of the old text log.
+
+    RETURNS
+    -------
+    piece_number : int
+        number of the piece in the game
+
+    state : Game_State
+        state like snapshot() returns
+    """
+    fields = line.split(",")
+    board = numpy.array([float(cell) for cell in fields[1:201]])
+    hold = fields[202]
+    if hold == "-":
+        hold = ""
+    state = Game_State.from_rows(to_bitboard(board.reshape(20, 10)),
+                                 fields[201], hold, fields[203:208])
+    return int(fields[0]), state
+
+
+def convert_text_log(text_path, log_path):
+    """
+    Convert an old text log into a binary log. Text logs have no moves or
+    times, they are logged as none and 0.
+
+    PARAMETERS
+    ----------
+    text_path : string
+        text log to read
+
+    log_path : string
+        binary log to write
+
+    RETURNS
+    -------
+    records : int
+        number of records converted
+    """
+    records = 0
+    with open(text_path) as text_file, open(log_path, "wb") as log_file:
+        log_file.write(LOG_MAGIC)
+        for line in text_file:
+            if line.strip() == "":
+                continue
+            piece_number, state = parse_text_record(line)
+            log_file.write(pack_record(piece_number, state, timestamp=0))
+            records += 1
+    return records
+
+
+def unpack_boards(data):
+    """
+    Unpack many boards packed by pack_board at once.
+
+    PARAMETERS
+    ----------
+    data : numpy.array(uint8)
+        (n, 25) packed boards
+
+    RETURNS
+    -------
+    boards : numpy.array(uint8)
+        (n, 20, 10) boards
+    """
+    # pack_bits puts the top row in the high bits and column x of a row
+    # in bit x, so the unpacked bits run right to left along each row
+    bits = numpy.unpackbits(data, axis=1).reshape(-1, 20, 10)
+    return numpy.ascontiguousarray(bits[:, :, ::-1])
+
+
+# ---------------------------------------------
+# RANDOM ACCESS READING
+#   - Binary logs find record i by arithmetic,
+#     text logs through an index of line
+#     offsets saved next to the log as .idx.
+# ---------------------------------------------
+def build_text_index(data):
+    """
+    Offsets of the non-empty lines of a text log.
+
+    PARAMETERS
+    ----------
+    data : mmap
+        mapped text log
+
+    RETURNS
+    -------
+    offsets : numpy.array(int64)
+        start of every record followed by the end of the last one
+    """
+    offsets = [0]
+    position = data.find(b"\n")
+    while position >= 0:
+        offsets.append(position + 1)
+        position = data.find(b"\n", position + 1)
+    if offsets[-1] != len(data):
+        offsets.append(len(data))
+
+    # Drop empty lines
+    offsets = numpy.array(offsets, dtype=numpy.int64)
+    keep = numpy.append(numpy.diff(offsets) > 1, True)
+    return offsets[keep]
+
+
+class Game_Log_Reader:
+    """
+    Random access to the records of a binary or text log through mmap.
+
+    ATTRIBUTES
+    ----------
+    path : string
+        log being read
+
+    binary : bool
+        whether the log is binary, otherwise text
+
+    data : mmap
+        mapped log
+
+    offsets : numpy.array(int64)
+        text logs only, start of every record and end of the last one
+
+    METHODS
+    -------
+    record():
+        one record by index
+
+    records():
+        records of a range with a stride
+
+    boards():
+        boards of a range with a stride as one array
+
+    close():
+        unmap the log
+    """
+
+    def __init__(self, path):
+        """
+        PARAMETERS
+        ----------
+        path : string
+            binary or text log to read, text logs are indexed on first
+            use and the index saved to path + ".idx"
+        """
+        self.path = path
+        with open(path, "rb") as log_file:
+            self.data = mmap.mmap(log_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        self.binary = self.data[:len(LOG_MAGIC)] == LOG_MAGIC
+
+        self.offsets = None
+        if not self.binary:
+            self.offsets = self.load_index()
+
+    def load_index(self):
+        """
+        Load the line index of a text log, rebuilding it when it is older
+        than the log.
+        """
+        index_path = self.path + ".idx"
+        if (os.path.exists(index_path)
+                and os.path.getmtime(index_path) >= os.path.getmtime(
+                    self.path)):
+            offsets = numpy.fromfile(index_path, dtype=numpy.int64)
+            if len(offsets) > 0 and offsets[-1] == len(self.data):
+                return offsets
+
+        offsets = build_text_index(self.data)
+        try:
+            offsets.tofile(index_path)
+        except OSError:
+            pass
+        return offsets
+
+    def __len__(self):
+        if self.binary:
+            return (len(self.data) - len(LOG_MAGIC)) // RECORD.size
+        return max(len(self.offsets) - 1, 0)
+
+    def record(self, index):
+        """
+        One record.
+
+        PARAMETERS
+        ----------
+        index : int
+            position of the record in the log, negative counts from the
+            end
+
+        RETURNS
+        -------
+        record : Log_Record
+            text logs have no moves or times
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"record {index} out of range")
+
+        if self.binary:
+            return unpack_record(self.data,
+                                 len(LOG_MAGIC) + index * RECORD.size)
+
+        line = self.data[self.offsets[index]:self.offsets[index + 1]]
+        piece_number, state = parse_text_record(line.decode())
+        return unpack_record(pack_record(piece_number, state, timestamp=0))
+
+    def __getitem__(self, index):
+        return self.record(index)
+
+    def records(self, start=None, stop=None, step=None):
+        """
+        Records start, start + step, ... up to stop, like a slice.
+        """
+        for index in range(*slice(start, stop, step).indices(len(self))):
+            yield self.record(index)
+
+    def boards(self, start=None, stop=None, step=None):
+        """
+        Boards of records start, start + step, ... up to stop, like a
+        slice.
+
+        RETURNS
+        -------
+        boards : numpy.array(uint8)
+            (n, 20, 10) boards
+        """
+        indices = range(*slice(start, stop, step).indices(len(self)))
+        if not self.binary:
+            return numpy.array([self.record(index).board
+                                for index in indices]).reshape(-1, 20, 10)
+
+        table = numpy.frombuffer(self.data, dtype=RECORD_DTYPE,
+                                 count=len(self), offset=len(LOG_MAGIC))
+        return unpack_boards(table["board"][numpy.asarray(indices, dtype=numpy.int64)])
+
+    def close(self):
+        """
+        Unmap the log.
+        """
+        self.data.close()
+
+
+if __name__ == "__main__":
+    # python Game_Log.py debug/log.txt debug/log.bin
+    records = convert_text_log(sys.argv[1], sys.argv[2])
+    print(f"Converted {records} records")
@@ -0,0 +1,152 @@
+from Bitboard import *
+
+
+class Game_State:
+    """
+    Immutable snapshot of a position: the board packed into one integer
+    and the pieces as integer codes. States hash and compare by value, so
+    they can key dictionaries and sets, and pickle to a few dozen bytes
+    for other processes.
+
+    ATTRIBUTES
+    ----------
+    board : int
+        bitboard packed by pack_bits
+
+    current : int
+        code of the piece that is about to be placed, see PIECE_NAMES
+
+    hold : int
+        code of the piece that is currently being held
+
+    queue : tuple(int)
+        codes of the upcoming pieces
+
+    METHODS
+    -------
+    from_rows():
+        state of a bitboard and piece names
+
+    from_game():
+        state of a game
+
+    rows():
+        bitboard of the state
+
+    to_array():
+        numpy board of the state
+
+    matches():
+        whether a captured state continues this one
+    """
+
+    __slots__ = ("board", "current", "hold", "queue", "_hash")
+
+    def __init__(self, board, current, hold, queue):
+        """
+        PARAMETERS
+        ----------
+        board : int
+            bitboard packed by pack_bits
+
+        current, hold : int
+            piece codes
+
+        queue : tuple(int)
+            piece codes of the upcoming pieces
+        """
+        queue = tuple(queue)
+        object.__setattr__(self, "board", board)
+        object.__setattr__(self, "current", current)
+        object.__setattr__(self, "hold", hold)
+        object.__setattr__(self, "queue", queue)
+        object.__setattr__(self, "_hash",
+                           hash((board, current, hold, queue)))
+
+    @classmethod
+    def from_rows(cls, rows, current_piece, hold_piece, queue):
+        """
+        State of a bitboard and piece names, unknown pieces get the "?"
+        code.
+
+        PARAMETERS
+        ----------
+        rows : list[int]
+            bitboard
+
+        current_piece, hold_piece : string
+            piece that is about to be placed and piece being held
+
+        queue : list[string]
+            upcoming pieces
+        """
+        return cls(pack_bits(rows), piece_code(current_piece),
+                   piece_code(hold_piece),
+                   tuple(piece_code(piece) for piece in queue))
+
+    @classmethod
+    def from_game(cls, game):
+        """
+        State of anything with board, current_piece, hold_piece and queue
+        attributes like Tetris_Game.
+        """
+        return cls.from_rows(to_bitboard(game.board.board),
+                             game.current_piece, game.hold_piece, game.queue)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Game_State is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Game_State is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Game_State):
+            return NotImplemented
+        return (self._hash == other._hash and self.board == other.board
+                and self.current == other.current
+                and self.hold == other.hold and self.queue == other.queue)
+
+    def __reduce__(self):
+        return (Game_State, (self.board, self.current, self.hold, self.queue))
+
+    def __repr__(self):
+        return (f"Game_State(board={self.board:#x}, "
+                f"current={self.current_piece!r}, hold={self.hold_piece!r}, "
+                f"queue={self.queue_pieces!r})")
+
+    @property
+    def current_piece(self):
+        return PIECE_NAMES[self.current]
+
+    @property
+    def hold_piece(self):
+        return PIECE_NAMES[self.hold]
+
+    @property
+    def queue_pieces(self):
+        return [PIECE_NAMES[code] for code in self.queue]
+
+    def rows(self):
+        """
+        Bitboard of the state.
+        """
+        return unpack_bits(self.board)
+
+    def to_array(self):
+        """
+        Numpy board of the state.
+        """
+        return to_array(self.rows())
+
+    def matches(self, other):
+        """
+        Whether other has the same board and pieces, with a queue that
+        starts with the queue of this state. A state built from the known
+        part of a queue matches every capture that continues it.
+        """
+        return (self.board == other.board and self.current == other.current
+                and self.hold == other.hold
+                and other.queue[:len(self.queue)] == self.queue)
@@ -0,0 +1,254 @@
+import threading
+from time import perf_counter
+
+
+# ---------------------------------------------
+# LATENCY BUCKETS
+#   - Upper edges in seconds, four per decade
+#     from 10us to 10s. Anything slower goes in
+#     the last bucket.
+# ---------------------------------------------
+BUCKET_EDGES = [10 ** (exponent / 4) for exponent in range(-20, 5)]
+
+
+class Latency_Histogram:
+    """
+    Fixed bucket histogram of latencies.
+
+    ATTRIBUTES
+    ----------
+    counts : list[int]
+        number of samples in each bucket of BUCKET_EDGES, plus one for
+        anything slower
+
+    count : int
+        number of samples
+
+    total : float
+        sum of the samples in seconds
+
+    maximum : float
+        slowest sample in seconds
+
+    METHODS
+    -------
+    record():
+        add a sample
+
+    percentile():
+        upper edge of the bucket holding a given percentile
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_EDGES) + 1)
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def record(self, seconds):
+        """
+        Add a sample.
+
+        PARAMETERS
+        ----------
+        seconds : float
+            latency of the sample
+
+        RETURNS
+        -------
+        None
+        """
+        bucket = 0
+        while bucket < len(BUCKET_EDGES) and seconds > BUCKET_EDGES[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, p):
+        """
+        Upper edge of the bucket holding the p-th percentile, in seconds.
+
+        PARAMETERS
+        ----------
+        p : float
+            percentile between 0 and 100
+
+        RETURNS
+        -------
+        latency : float
+            bucket edge, the maximum for the overflow bucket and 0 without
+            samples
+        """
+        if self.count == 0:
+            return 0
+        target = p / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count > 0:
+                if bucket == len(BUCKET_EDGES):
+                    return self.maximum
+                return min(BUCKET_EDGES[bucket], self.maximum)
+        return self.maximum
+
+
+class Stage_Timer:
+    """
+    Per stage latency histograms for the main loop. When disabled, tic()
+    and toc() return straight away. Samples may be recorded from several
+    threads, e.g. the capture thread.
+
+    ATTRIBUTES
+    ----------
+    enabled : bool
+        whether samples are recorded
+
+    stages : dict{string : Latency_Histogram}
+        histogram of every stage, in the order they were first seen
+
+    dump_path : string or None
+        file the summary is periodically written to
+
+    dump_interval : float
+        seconds between dumps
+
+    last_dump : float
+        perf_counter() time of the last dump
+
+    METHODS
+    -------
+    tic():
+        start timing a stage
+
+    toc():
+        finish timing a stage
+
+    record():
+        add a sample measured elsewhere
+
+    summary():
+        table of count, mean, p50/p95/p99 and max of every stage
+
+    dump():
+        write the summary to dump_path
+    """
+
+    def __init__(self, enabled=False, dump_path=None, dump_interval=10):
+        """
+        PARAMETERS
+        ----------
+        enabled : bool
+            whether samples are recorded
+
+        dump_path : string or None
+            file the summary is periodically written to
+
+        dump_interval : float
+            seconds between dumps
+        """
+        self.enabled = enabled
+        self.stages = {}
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.last_dump = perf_counter()
+        self.lock = threading.Lock()
+
+    def tic(self):
+        """
+        Start timing a stage.
+
+        RETURNS
+        -------
+        tic : float
+            perf_counter() time to pass to toc(), 0 when disabled
+        """
+        if self.enabled:
+            return perf_counter()
+        return 0
+
+    def toc(self, stage, tic):
+        """
+        Finish timing a stage started with tic().
+
+        PARAMETERS
+        ----------
+        stage : string
+            name of the stage
+
+        tic : float
+            value returned by tic()
+
+        RETURNS
+        -------
+        seconds : float
+            latency recorded, 0 when disabled
+        """
+        if not self.enabled:
+            return 0
+        seconds = perf_counter() - tic
+        self.record(stage, seconds)
+        return seconds
+
+    def record(self, stage, seconds):
+        """
+        Add a sample to a stage, dumping the summary when it is due.
+
+        PARAMETERS
+        ----------
+        stage : string
+            name of the stage
+
+        seconds : float
+            latency of the sample
+
+        RETURNS
+        -------
+        None
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Latency_Histogram()
+            histogram.record(seconds)
+            due = (self.dump_path is not None
+                   and perf_counter() - self.last_dump > self.dump_interval)
+        if due:
+            self.dump()
+
+    def summary(self):
+        """
+        Table of count, mean, p50/p95/p99 and max of every stage, in
+        milliseconds.
+
+        RETURNS
+        -------
+        summary : string
+            one line per stage
+        """
+        lines = [f"{'stage':16}{'count':>8}{'mean':>10}{'p50':>10}"
+                 f"{'p95':>10}{'p99':>10}{'max':>10}"]
+        with self.lock:
+            stages = list(self.stages.items())
+        for stage, histogram in stages:
+            mean = histogram.total / max(histogram.count, 1)
+            lines.append(
+                f"{stage:16}{histogram.count:8d}{mean * 1e3:10.3f}"
+                f"{histogram.percentile(50) * 1e3:10.3f}"
+                f"{histogram.percentile(95) * 1e3:10.3f}"
+                f"{histogram.percentile(99) * 1e3:10.3f}"
+                f"{histogram.maximum * 1e3:10.3f}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self):
+        """
+        Write the summary to dump_path.
+        """
+        self.last_dump = perf_counter()
+        if self.dump_path is not None:
+            with open(self.dump_path, "w") as dump_file:
+                dump_file.write(self.summary())
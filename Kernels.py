@@ -0,0 +1,430 @@
+import random
+
+import numpy
+
+from Board import *
+from Pieces import *
+
+# Numba is optional, without it the jit engine falls back to the NumPy
+# engine and these kernels run as plain (slow) Python
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+# ---------------------------------------------
+# PIECE ARRAYS
+#   - PIECE_CELLS, PIECE_SKIRT and PIECE_HEIGHT
+#     as arrays the kernels can read, one entry
+#     per orientation of each piece.
+# ---------------------------------------------
+def build_piece_arrays():
+    """
+    Pack the placement tables of every piece into arrays.
+
+    RETURNS
+    -------
+    arrays : dict{string : tuple(numpy.array(int64))}
+        for each piece, (cells, skirts, widths, heights) of its
+        orientations. cells are (states, 4, 2) (row, col) offsets and
+        skirts (states, 4) padded with zeros
+    """
+    arrays = {}
+    for piece, num_states in NUM_PIECE_STATES.items():
+        keys = PIECE_KEYS[piece]
+        cells = numpy.array([PIECE_CELLS[key] for key in keys],
+                            dtype=numpy.int64)
+        skirts = numpy.zeros((num_states, 4), dtype=numpy.int64)
+        for state, key in enumerate(keys):
+            skirts[state, :len(PIECE_SKIRT[key])] = PIECE_SKIRT[key]
+        widths = numpy.array([len(PIECE_SKIRT[key]) for key in keys],
+                             dtype=numpy.int64)
+        heights = numpy.array([PIECE_HEIGHT[key] for key in keys],
+                              dtype=numpy.int64)
+        arrays[piece] = (cells, skirts, widths, heights)
+    return arrays
+
+
+PIECE_ARRAYS = build_piece_arrays()
+
+
+# ---------------------------------------------
+# BOARD KERNELS
+#   - Loop versions of the Board.py helpers,
+#     returning exactly the same values.
+# ---------------------------------------------
+@njit(cache=True)
+def rows_cleared_kernel(board, max_row):
+    clear_rows = 0
+    for row in range(max(max_row, 0), 20):
+        full = True
+        for col in range(10):
+            if board[row, col] == 0:
+                full = False
+                break
+        if full:
+            clear_rows += 1
+    return clear_rows
+
+
+@njit(cache=True)
+def clear_filled_kernel(board):
+    """
+    Clear filled rows in place.
+
+    RETURNS
+    -------
+    clear_rows : int
+        number of rows cleared
+    """
+    target = 19
+    for row in range(19, -1, -1):
+        full = True
+        for col in range(10):
+            if board[row, col] == 0:
+                full = False
+                break
+        if not full:
+            if target != row:
+                board[target, :] = board[row, :]
+            target -= 1
+    for row in range(target, -1, -1):
+        board[row, :] = 0
+    # Rows target and above were emptied, one per cleared row
+    return target + 1
+
+
+@njit(cache=True)
+def column_tops_kernel(board, tops):
+    """
+    Row of the top of every column, 20 for an empty one.
+    """
+    for col in range(10):
+        tops[col] = 20
+        for row in range(20):
+            if board[row, col] > 0:
+                tops[col] = row
+                break
+
+
+@njit(cache=True)
+def features_kernel(board):
+    """
+    get_max_height, get_min_height, find_holes and get_roughness in one
+    pass.
+    """
+    max_row = 20
+    min_row = 0
+    holes = 0
+    roughness = 0
+    last_height = 0
+    for col in range(10):
+        top = 20
+        filled = 0
+        for row in range(20):
+            if board[row, col] > 0:
+                if top == 20:
+                    top = row
+                filled += 1
+        if top < max_row:
+            max_row = top
+        if top > min_row:
+            min_row = top
+        height = 20 - top
+        holes += height - filled
+        if col > 0:
+            roughness += abs(height - last_height)
+        last_height = height
+    return max_row, min_row, holes, roughness
+
+
+@njit(cache=True)
+def simulate_piece_kernel(board, piece, max_row, col):
+    """
+    Tetris_Game.simulate_piece() without the numpy temporaries.
+    """
+    rows = piece.shape[0]
+    cols = piece.shape[1]
+    valid_upper = 0
+    valid_lower = 0
+    found_valid = False
+    for upper in range(max(max_row - rows, 0), 21 - rows):
+        collision = False
+        for y in range(rows):
+            for x in range(cols):
+                if piece[y, x] > 0 and board[upper + y, col + x] > 0:
+                    collision = True
+        if collision:
+            break
+        valid_upper = upper
+        valid_lower = upper + rows
+        found_valid = True
+    return valid_upper, valid_lower, found_valid
+
+
+@njit(cache=True)
+def heuristic_kernel(board, max_row, weights):
+    """
+    Tetris_Game.calculate_heuristic() in one compiled call.
+
+    RETURNS
+    -------
+    H : float
+        heuristic evaluation
+
+    cleared_board : numpy.array(uint8)
+        copy of board with filled rows cleared
+
+    clear_rows : int
+        number of rows cleared
+    """
+    clear_rows = rows_cleared_kernel(board, max_row)
+    cleared_board = board.copy()
+    if clear_rows > 0:
+        clear_filled_kernel(cleared_board)
+    new_max_row, min_row, holes, roughness = features_kernel(cleared_board)
+    height_diff = min_row - new_max_row
+    H = - weights[0] * height_diff - weights[1] * \
+        holes + weights[2] * clear_rows - weights[3] * roughness
+    return H, cleared_board, clear_rows
+
+
+@njit(cache=True)
+def score_placements_kernel(board, cells, skirts, widths, heights, weights,
+                            scores, valid, scratch, tops):
+    """
+    Land every orientation of a piece in every column and score it.
+
+    PARAMETERS
+    ----------
+    board : numpy.array(uint8)
+        board containing game state
+
+    cells, skirts, widths, heights : numpy.array(int64)
+        placement tables of the piece, see build_piece_arrays
+
+    weights : numpy.array(float)
+        heuristic weights
+
+    scores : numpy.array(float)
+        (states, 10) output, heuristic of the piece in each orientation
+        and leftmost column
+
+    valid : numpy.array(bool)
+        (states, 10) output, whether the placement fits
+
+    scratch : numpy.array(uint8)
+        (20, 10) buffer the candidates are played on
+
+    tops : numpy.array(int64)
+        (10,) buffer for the column tops
+
+    Only the first states rows of scores and valid are written, so
+    buffers sized for four orientations fit every piece.
+
+    RETURNS
+    -------
+    None
+    """
+    column_tops_kernel(board, tops)
+
+    for state in range(cells.shape[0]):
+        for col in range(10):
+            valid[state, col] = False
+            if col + widths[state] > 10:
+                continue
+
+            # Land the piece on the column heights, like get_landing_row
+            bottom = 0
+            for c in range(widths[state]):
+                landing = 20 - tops[col + c] - skirts[state, c]
+                if landing > bottom:
+                    bottom = landing
+            upper = 20 - bottom - heights[state]
+            if upper < 0:
+                continue
+
+            scratch[:, :] = board
+            for i in range(cells.shape[1]):
+                scratch[upper + cells[state, i, 0],
+                        col + cells[state, i, 1]] = 1
+            clear_rows = clear_filled_kernel(scratch)
+            max_row, min_row, holes, roughness = features_kernel(scratch)
+
+            height_diff = min_row - max_row
+            scores[state, col] = - weights[0] * height_diff - weights[1] * \
+                holes + weights[2] * clear_rows - weights[3] * roughness
+            valid[state, col] = True
+
+
+def scratch_buffers():
+    """
+    Buffers for score_placements_kernel, allocated once per game.
+
+    RETURNS
+    -------
+    buffers : tuple(numpy.array)
+        (scores, valid, scratch, tops)
+    """
+    return (numpy.empty((4, 10)), numpy.empty((4, 10), dtype=numpy.bool_),
+            numpy.empty((20, 10), dtype=numpy.uint8),
+            numpy.empty(10, dtype=numpy.int64))
+
+
+def place_piece(board, piece, state, col):
+    """
+    Hard drop a piece on a copy of board and clear filled rows.
+
+    PARAMETERS
+    ----------
+    board : numpy.array(uint8)
+        board containing game state
+
+    piece : string
+        piece, e.g. "T"
+
+    state, col : int
+        orientation and leftmost column of the piece
+
+    RETURNS
+    -------
+    cleared_board : numpy.array(uint8)
+        board with the piece placed and filled rows cleared
+    """
+    piece_key = PIECE_KEYS[piece][state]
+    upper, _, _ = get_landing_row(get_column_heights(board), piece_key, col)
+    cleared_board = numpy.copy(board)
+    for y, x in PIECE_CELLS[piece_key]:
+        cleared_board[upper + y, col + x] = 1
+    clear_filled_kernel(cleared_board)
+    return cleared_board
+
+
+def warm_up():
+    """
+    Compile every kernel ahead of the first piece. Compiled kernels are
+    cached on disk, so later runs only load them.
+    """
+    board = numpy.zeros((20, 10), dtype=numpy.uint8)
+    board[19, :9] = 1
+    weights = numpy.array([0, 3, 2, 0.5])
+    rows_cleared_kernel(board, 19)
+    clear_filled_kernel(numpy.copy(board))
+    features_kernel(board)
+    simulate_piece_kernel(board, PIECE_SHAPE["T0"], 19, 0)
+    heuristic_kernel(board, 19, weights)
+    cells, skirts, widths, heights = PIECE_ARRAYS["T"]
+    scores, valid, scratch, tops = scratch_buffers()
+    score_placements_kernel(board, cells, skirts, widths, heights, weights,
+                            scores, valid, scratch, tops)
+
+
+# ---------------------------------------------
+# PARITY CHECK
+#   - Compares every kernel with the reference
+#     helpers on random boards:
+#       python Kernels.py [boards]
+# ---------------------------------------------
+PARITY_BOARDS = 400
+
+
+def check_parity(boards=PARITY_BOARDS, seed=0):
+    """
+    Compare the kernels with the Board.py helpers, simulate_piece and
+    calculate_heuristic on random boards.
+
+    RETURNS
+    -------
+    mismatches : list[string]
+        description of every mismatch
+    """
+    from Tetris_Game import Tetris_Game, DEFAULT_WEIGHTS
+
+    game = Tetris_Game(capture=False, weights=DEFAULT_WEIGHTS)
+    weights = numpy.array(game.weights, dtype=float)
+    rng = random.Random(seed)
+    mismatches = []
+
+    for n in range(boards):
+        board = numpy.zeros((20, 10), dtype=numpy.uint8)
+        height = rng.randint(0, 19)
+        for y in range(20 - height, 20):
+            for x in range(10):
+                board[y, x] = rng.random() < 0.7
+            if rng.random() < 0.2:
+                board[y, :] = 1
+        max_row = get_max_height(board)
+
+        if rows_cleared_kernel(board, max_row) != rows_cleared(board,
+                                                               max_row):
+            mismatches.append(f"board {n}: rows_cleared")
+        cleared = numpy.copy(board)
+        clear_filled_kernel(cleared)
+        reference = clear_filled_rows(numpy.copy(board))
+        if not numpy.array_equal(cleared, reference):
+            mismatches.append(f"board {n}: clear_filled_rows")
+        features = (get_max_height(reference), get_min_height(reference),
+                    find_holes(reference), get_roughness(reference))
+        if features_kernel(reference) != features:
+            mismatches.append(f"board {n}: features")
+
+        H, cleared, _ = heuristic_kernel(board, max_row, weights)
+        H_ref, cleared_ref = game.calculate_heuristic(board, max_row)
+        if H != H_ref or not numpy.array_equal(cleared, cleared_ref):
+            mismatches.append(f"board {n}: calculate_heuristic")
+
+        for piece_key, piece in PIECE_SHAPE.items():
+            for col in range(11 - piece.shape[1]):
+                if (simulate_piece_kernel(board, piece, max_row, col)
+                        != game.simulate_piece(board, piece, piece.shape,
+                                               max_row, col)):
+                    mismatches.append(
+                        f"board {n}: simulate_piece {piece_key} {col}")
+
+        # Every placement of every piece against the NumPy engine scoring
+        game.board.board = numpy.copy(board)
+        game.board.update()
+        game.table.clear()
+        for piece, (cells, skirts, widths, heights) in PIECE_ARRAYS.items():
+            scores, valid, scratch, tops = scratch_buffers()
+            score_placements_kernel(board, cells, skirts, widths, heights,
+                                    weights, scores, valid, scratch, tops)
+            for state in range(len(cells)):
+                piece_key = PIECE_KEYS[piece][state]
+                for col in range(11 - widths[state]):
+                    upper, _, found = get_landing_row(
+                        game.board.column_heights, piece_key, col)
+                    if found != valid[state, col]:
+                        mismatches.append(
+                            f"board {n}: landing {piece_key} {col}")
+                    elif found:
+                        H_ref = game.calculate_heuristic_incremental(
+                            upper, col, piece_key)
+                        cleared = place_piece(board, piece, state, col)
+                        game.board.make(upper, col, piece_key)
+                        same = numpy.array_equal(cleared, game.board.board)
+                        game.board.unmake()
+                        if scores[state, col] != H_ref or not same:
+                            mismatches.append(
+                                f"board {n}: placement {piece_key} {col}")
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+
+    boards = int(sys.argv[1]) if len(sys.argv) > 1 else PARITY_BOARDS
+    print(f"Numba available: {NUMBA_AVAILABLE}")
+    mismatches = check_parity(boards)
+    for mismatch in mismatches[:20]:
+        print(mismatch)
+    print(f"{len(mismatches)} mismatches on {boards} boards")
+    sys.exit(1 if len(mismatches) > 0 else 0)
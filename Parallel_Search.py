@@ -0,0 +1,216 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from Search import *
+
+
+# ---------------------------------------------
+# WORKER STATE
+#   - Every worker process keeps its own
+#     transposition table between pieces.
+# ---------------------------------------------
+_worker_table = None
+
+
+def init_worker(table_size):
+    """
+    Set up the transposition table of a worker process.
+    """
+    global _worker_table
+    _worker_table = Transposition_Table(table_size)
+
+
+def warm_worker():
+    """
+    No-op task used to start a worker process ahead of the first piece.
+    """
+    return True
+
+
+def search_nodes(nodes, sequence, weights, keep, beam_width, table=None):
+    """
+    Expand a slice of the beam by one ply and keep its best children. Runs
+    in the worker processes, or locally as the sequential fallback.
+
+    Every position in the best beam_width of the whole ply is among the
+    best beam_width of the slice it came from, so merging the slices gives
+    the same beam as expanding the whole beam at once.
+
+    PARAMETERS
+    ----------
+    nodes : list[node]
+        contiguous slice of the beam, see Search.expand. Boards are packed,
+        so a node pickles to about a hundred bytes
+
+    sequence : list[string]
+        current piece followed by the known queue
+
+    weights : list[float]
+        heuristic weights
+
+    keep : int
+        number of positions kept after the ply, see expand_beam
+
+    beam_width : int
+        number of nodes kept after every ply
+
+    table : Transposition_Table or None
+        cache of evaluated boards, the worker's own table if None
+
+    RETURNS
+    -------
+    children : list[node]
+        best beam_width unique children of the slice, best first
+    """
+    if table is None:
+        table = _worker_table
+
+    children = expand_beam(nodes, sequence, weights, keep, table)
+    children.sort(key=lambda child: -child[0])
+    return best_unique(children, beam_width)
+
+
+class Search_Pool:
+    """
+    A persistent pool of worker processes splitting every ply of a beam
+    search between them.
+
+    ATTRIBUTES
+    ----------
+    workers : int
+        number of worker processes, 1 or less searches sequentially
+
+    executor : ProcessPoolExecutor or None
+        the worker processes, None when searching sequentially
+
+    table : Transposition_Table
+        cache used by the sequential fallback
+
+    METHODS
+    -------
+    search():
+        find the best root move
+
+    expand():
+        expand a beam by one ply across the workers
+
+    shutdown():
+        stop the worker processes
+    """
+
+    def __init__(self, workers, table_size=2 ** 16):
+        """
+        Starts the workers so the first piece does not pay for it.
+
+        PARAMETERS
+        ----------
+        workers : int
+            number of worker processes, 1 or less searches sequentially
+
+        table_size : int
+            number of evaluated boards kept by each worker
+        """
+        self.workers = workers
+        self.table = Transposition_Table(table_size)
+        self.executor = None
+
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(table_size,))
+            for future in [self.executor.submit(warm_worker)
+                           for _ in range(workers)]:
+                future.result()
+
+    def search(self, rows, sequence, hold, weights, beam_width, beam_depth):
+        """
+        Beam search with every ply split across the workers. Each worker
+        expands a contiguous slice of the beam and sends back only its
+        best children, so the search does the same work as beam_search()
+        and returns the same move whatever the number of workers.
+
+        PARAMETERS
+        ----------
+        rows : list[int]
+            bitboard of the current board
+
+        sequence : list[string]
+            current piece followed by the known queue
+
+        hold : string
+            piece that is currently being held, "" if none
+
+        weights : list[float]
+            heuristic weights
+
+        beam_width : int
+            number of nodes kept after every ply
+
+        beam_depth : int
+            number of pieces to place, including the root move
+
+        RETURNS
+        -------
+        move : tuple(int, int, bool) or None
+            (orientation, col, hold_select) of the best root move, None if
+            no piece can be placed
+
+        root_rows : list[int]
+            bitboard after the best root move
+
+        score : float
+            score of the best node found
+        """
+        beam = [(0, 0, pack_bits(rows), hold, 0, None, zobrist_bits(rows))]
+        best = None
+
+        for ply in range(beam_depth):
+            keep = 1 if ply == beam_depth - 1 else beam_width
+            children = self.expand(beam, sequence, weights, keep,
+                                   beam_width)
+            if len(children) == 0:
+                break
+
+            # Slices are merged in beam order, so the stable sort breaks
+            # ties like beam_search()
+            children.sort(key=lambda child: -child[0])
+            beam = best_unique(children, beam_width)
+            best = beam[0]
+
+        if best is None:
+            return None, rows, -99999
+
+        move, root_board = best[5]
+        return move, unpack_bits(root_board), best[0]
+
+    def expand(self, beam, sequence, weights, keep, beam_width):
+        """
+        Expand a beam by one ply, one slice per worker. A single node, like
+        the root, is expanded locally as shipping it costs more than it
+        saves.
+        """
+        slices = min(self.workers, len(beam))
+        if self.executor is not None and slices > 1:
+            size = -(-len(beam) // slices)
+            try:
+                futures = [self.executor.submit(
+                               search_nodes, beam[i:i + size], sequence,
+                               weights, keep, beam_width)
+                           for i in range(0, len(beam), size)]
+                return [child for future in futures
+                        for child in future.result()]
+            except BrokenProcessPool:
+                # Search locally from now on, the broken pool is released
+                self.shutdown()
+
+        return search_nodes(beam, sequence, weights, keep, beam_width,
+                            self.table)
+
+    def shutdown(self):
+        """
+        Stop the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
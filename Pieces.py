@@ -0,0 +1,132 @@
+import numpy
+
+
+# Define shape of all pieces
+#   Pieces will be defined from state 0: horizontal
+#   Then rotated counterclockwise until no new states are found
+#   Piece state denoted by "{piece}{state_number}", e.g. L0, L1
+# Eventually convert this to something I can read in
+PIECE_SHAPE = {}
+PIECE_SHAPE["I0"] = numpy.ones([1, 4])
+PIECE_SHAPE["I1"] = numpy.ones([4, 1])
+
+PIECE_SHAPE["O0"] = numpy.ones([2, 2])
+
+PIECE_SHAPE["T0"] = numpy.array([[0, 1, 0],
+                                 [1, 1, 1]])
+PIECE_SHAPE["T1"] = numpy.array([[0, 1],
+                                 [1, 1],
+                                 [0, 1]])
+PIECE_SHAPE["T2"] = numpy.array([[1, 1, 1],
+                                 [0, 1, 0]])
+PIECE_SHAPE["T3"] = numpy.array([[1, 0],
+                                 [1, 1],
+                                 [1, 0]])
+
+PIECE_SHAPE["S0"] = numpy.array([[0, 1, 1],
+                                 [1, 1, 0]])
+PIECE_SHAPE["S1"] = numpy.array([[1, 0],
+                                 [1, 1],
+                                 [0, 1]])
+
+PIECE_SHAPE["Z0"] = numpy.array([[1, 1, 0],
+                                 [0, 1, 1]])
+PIECE_SHAPE["Z1"] = numpy.array([[0, 1],
+                                 [1, 1],
+                                 [1, 0]])
+
+PIECE_SHAPE["J0"] = numpy.array([[1, 0, 0],
+                                 [1, 1, 1]])
+PIECE_SHAPE["J1"] = numpy.array([[0, 1],
+                                 [0, 1],
+                                 [1, 1]])
+PIECE_SHAPE["J2"] = numpy.array([[1, 1, 1],
+                                 [0, 0, 1]])
+PIECE_SHAPE["J3"] = numpy.array([[1, 1],
+                                 [1, 0],
+                                 [1, 0]])
+
+PIECE_SHAPE["L0"] = numpy.array([[0, 0, 1],
+                                 [1, 1, 1]])
+PIECE_SHAPE["L1"] = numpy.array([[1, 1],
+                                 [0, 1],
+                                 [0, 1]])
+PIECE_SHAPE["L2"] = numpy.array([[1, 1, 1],
+                                 [1, 0, 0]])
+PIECE_SHAPE["L3"] = numpy.array([[1, 0],
+                                 [1, 0],
+                                 [1, 1]])
+
+# Boards are uint8, shapes match so they can be added to a board in place
+PIECE_SHAPE = {key: piece.astype(numpy.uint8)
+               for key, piece in PIECE_SHAPE.items()}
+
+# The number of rotated states a piece can take
+NUM_PIECE_STATES = {}
+NUM_PIECE_STATES["I"] = 2
+NUM_PIECE_STATES["O"] = 1
+NUM_PIECE_STATES["T"] = 4
+NUM_PIECE_STATES["S"] = 2
+NUM_PIECE_STATES["Z"] = 2
+NUM_PIECE_STATES["J"] = 4
+NUM_PIECE_STATES["L"] = 4
+
+# Orientation keys of every piece, indexed by orientation
+PIECE_KEYS = {piece: tuple(piece + str(states) for states in range(num))
+              for piece, num in NUM_PIECE_STATES.items()}
+
+# Integer piece codes, e.g. for logs and Game_State. "" is no piece, "U" a
+# just held piece and "?" a piece that could not be read
+PIECE_NAMES = ("", "I", "O", "T", "S", "Z", "J", "L", "U", "?")
+PIECE_CODE = {name: code for code, name in enumerate(PIECE_NAMES)}
+UNKNOWN_PIECE = "?"
+
+
+def piece_code(piece):
+    """
+    Code of a piece, the unknown code for anything PIECE_NAMES lacks.
+    """
+    return PIECE_CODE.get(piece, PIECE_CODE[UNKNOWN_PIECE])
+
+
+def build_placement_tables(piece_shape):
+    """
+    Precompute the column profiles used to land a piece without scanning
+    the board.
+
+    PARAMETERS
+    ----------
+    piece_shape : dict{string : numpy.array(float)}
+        numpy representation of each rotation for every piece
+
+    RETURNS
+    -------
+    skirt : dict{string : tuple(int)}
+        for each column of the piece, the number of empty cells between the
+        bottom of the piece and its lowest filled cell
+
+    profile : dict{string : tuple(int)}
+        for each column of the piece, the height of its highest filled cell
+        above the bottom of the piece
+
+    height : dict{string : int}
+        number of rows of the piece
+    """
+    skirt = {}
+    profile = {}
+    height = {}
+    for key, piece in piece_shape.items():
+        h = numpy.shape(piece)[0]
+        filled = [numpy.nonzero(col)[0] for col in piece.T]
+        skirt[key] = tuple(int(h - 1 - rows[-1]) for rows in filled)
+        profile[key] = tuple(int(h - rows[0]) for rows in filled)
+        height[key] = h
+    return skirt, profile, height
+
+
+PIECE_SKIRT, PIECE_PROFILE, PIECE_HEIGHT = build_placement_tables(PIECE_SHAPE)
+
+# Filled cells of every orientation as (row, col) offsets from its top left
+PIECE_CELLS = {key: tuple((int(y), int(x))
+                          for y, x in zip(*numpy.nonzero(piece)))
+               for key, piece in PIECE_SHAPE.items()}
@@ -0,0 +1,193 @@
+import threading
+from time import perf_counter
+
+from Game_State import *
+from Search import *
+
+
+class Ponderer:
+    """
+    Searches the next position on a background thread while the current
+    move is typed and the next piece is captured.
+
+    Once a move is committed the next board, current piece and hold are
+    known, and so is every queue piece but the new last one. The search
+    only uses the known pieces, so its result stays valid as long as the
+    captured queue starts with them.
+
+    ATTRIBUTES
+    ----------
+    game : Tetris_Game object
+        headless game the background search runs on, with the engine and
+        settings of the game being played. Only one search uses it at a
+        time, a discarded one is cancelled and joined before the next starts
+
+    ponder_time : float
+        seconds the background search may run
+
+    thread : Thread or None
+        background search, None if nothing is being pondered
+
+    cancel : Event or None
+        stops the background search, an anytime search returns the deepest
+        search completed so far
+
+    state : Game_State or None
+        position being pondered, its queue holds the known pieces only
+
+    result : tuple or None
+        (move, rows) found by the background search
+
+    hits : int
+        number of pondered results reused
+
+    misses : int
+        number of pondered results discarded
+
+    METHODS
+    -------
+    start():
+        start pondering a position
+
+    take():
+        stop the background search and get its result if it matches the
+        captured position
+
+    stop():
+        cancel the background search
+    """
+
+    def __init__(self, game, ponder_time):
+        """
+        PARAMETERS
+        ----------
+        game : Tetris_Game object
+            headless game to search on, built with capture=False
+
+        ponder_time : float
+            seconds the background search may run
+        """
+        self.game = game
+        self.ponder_time = ponder_time
+        self.thread = None
+        self.cancel = None
+        self.state = None
+        self.result = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, rows, current_piece, hold_piece, queue):
+        """
+        Start pondering the position after a committed move.
+
+        PARAMETERS
+        ----------
+        rows : list[int]
+            bitboard after the committed move
+
+        current_piece : string
+            piece that will be current next, i.e. the first queue piece
+
+        hold_piece : string
+            piece that is currently being held
+
+        queue : list[string]
+            rest of the queue, unknown pieces as ""
+
+        RETURNS
+        -------
+        None
+        """
+        # The game is free once a search still running has stopped
+        self.stop()
+
+        sequence = piece_sequence(current_piece, queue)
+        if len(sequence) == 0 or (hold_piece == "" and len(sequence) < 2):
+            # Holding into an unknown piece cannot be searched
+            self.state = None
+            return
+
+        self.state = Game_State.from_rows(rows, current_piece, hold_piece,
+                                          sequence[1:])
+        self.result = None
+        self.cancel = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(Game_State.from_rows(rows, current_piece, hold_piece,
+                                       queue),
+                  perf_counter() + self.ponder_time, self.cancel),
+            daemon=True)
+        self.thread.start()
+
+    def run(self, state, deadline, cancel):
+        """
+        Body of the background thread.
+        """
+        self.game.load_state(state)
+        try:
+            move = self.game.search(deadline, cancel)
+        except Search_Timeout:
+            # Cancelled before the engine had a move
+            return
+
+        # A discarded search must not overwrite the result of the next one
+        if threading.current_thread() is self.thread:
+            self.result = (move, to_bitboard(self.game.board.board))
+
+    def stop(self, wait=True):
+        """
+        Cancel the background search.
+
+        PARAMETERS
+        ----------
+        wait : bool
+            whether to wait for the search to return, a search left running
+            is waited for by the next start()
+
+        RETURNS
+        -------
+        None
+        """
+        if self.cancel is not None:
+            self.cancel.set()
+        if wait and self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.cancel = None
+
+    def take(self, state):
+        """
+        Get the pondered result for the captured position. The background
+        search is cancelled rather than waited for, so taking a result
+        never takes longer than the search checking its cancel event.
+
+        PARAMETERS
+        ----------
+        state : Game_State
+            captured position
+
+        RETURNS
+        -------
+        result : tuple(tuple(int, int, bool), list[int]) or None
+            (move, rows after the move) if the pondered position matches,
+            None otherwise
+        """
+        if self.state is None:
+            return None
+
+        pondered = self.state
+        self.state = None
+        if not pondered.matches(state):
+            # Nothing to wait for, the search only has to stop competing
+            # with the one that replaces it
+            self.stop(wait=False)
+            self.misses += 1
+            return None
+
+        self.stop()
+        if self.result is None or self.result[0] is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self.result
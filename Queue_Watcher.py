@@ -0,0 +1,192 @@
+from collections import Counter
+from time import perf_counter
+from time import sleep
+
+import numpy
+
+from Frame_Decoder import *
+from Instrumentation import *
+
+
+class Queue_Timeout(TimeoutError):
+    """
+    Raised when the queue does not change before the timeout, e.g. when
+    the game has ended.
+    """
+
+
+class Queue_Watcher:
+    """
+    Waits for the next piece by polling only the column of screen holding
+    the queue indicator pixels.
+
+    Each poll grabs a 1 pixel wide strip and compares the raw bytes of the
+    five indicator pixels with the last seen ones. The queue is only
+    decoded when they change. The poll interval starts short and grows
+    while nothing changes.
+
+    ATTRIBUTES
+    ----------
+    sct : MSS
+        mss instance for screenshots
+
+    monitor : dict{string : int}
+        screen strip covering the queue indicator pixels
+
+    rows : numpy.array(int)
+        rows of the indicator pixels in the strip
+
+    decoder : Frame_Decoder object
+        classifies the indicator pixels
+
+    min_interval, max_interval : float
+        bounds of the poll interval in seconds
+
+    timeout : float
+        seconds to wait before raising Queue_Timeout
+
+    last_polls : int
+        number of polls the last piece took
+
+    poll_counts : Counter{int : int}
+        number of pieces that took each number of polls
+
+    timeouts : int
+        number of waits that timed out
+
+    timers : Stage_Timer object
+        records every "capture" and "decode", and the rest of each wait as
+        "wait"
+
+    busy : float
+        seconds of the current wait spent capturing and decoding
+
+    METHODS
+    -------
+    poll():
+        grab the strip and fingerprint it
+
+    wait_for_change():
+        wait until the queue differs from a given one
+    """
+
+    def __init__(self, sct, monitor_full_board, decoder,
+                 min_interval=0.0005, max_interval=0.008, timeout=5,
+                 timers=None):
+        """
+        PARAMETERS
+        ----------
+        sct : MSS
+            mss instance for screenshots
+
+        monitor_full_board : dict{string : int}
+            section of screen the full board screenshot covers
+
+        decoder : Frame_Decoder object
+            classifies the indicator pixels
+
+        min_interval, max_interval : float
+            bounds of the poll interval in seconds
+
+        timeout : float
+            seconds to wait before raising Queue_Timeout
+
+        timers : Stage_Timer object or None
+            stage latencies, disabled if None
+        """
+        x = QUEUE_PIXELS[0][0]
+        top = QUEUE_PIXELS[0][1]
+        bottom = QUEUE_PIXELS[-1][1]
+
+        self.sct = sct
+        self.monitor = {
+            "top": monitor_full_board["top"] + top,
+            "left": monitor_full_board["left"] + x,
+            "width": 1,
+            "height": bottom - top + 1}
+        self.rows = numpy.array([y - top for _, y in QUEUE_PIXELS])
+        self.decoder = decoder
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+
+        self.last_polls = 0
+        self.poll_counts = Counter()
+        self.timeouts = 0
+        self.timers = timers if timers is not None else Stage_Timer()
+        self.busy = 0
+
+    def poll(self):
+        """
+        Grab the strip holding the queue.
+
+        RETURNS
+        -------
+        pixels : numpy.array(uint8)
+            (5, 4) BGRA indicator pixels
+
+        fingerprint : bytes
+            raw bytes of the indicator pixels
+        """
+        tic = self.timers.tic()
+        pixels = frame_view(self.sct.grab(self.monitor))[self.rows, 0]
+        self.busy += self.timers.toc("capture", tic)
+        return pixels, pixels.tobytes()
+
+    def decode(self, pixels):
+        """
+        Decode the queue from the indicator pixels.
+        """
+        tic = self.timers.tic()
+        queue = self.decoder.classify(greyscale(pixels))
+        self.busy += self.timers.toc("decode", tic)
+        return queue
+
+    def wait_for_change(self, queue):
+        """
+        Wait until the queue on screen differs from the given one.
+
+        PARAMETERS
+        ----------
+        queue : list[string]
+            queue before the current piece was placed
+
+        RETURNS
+        -------
+        new_queue : list[string]
+            queue on screen once it has changed
+        """
+        start = perf_counter()
+        interval = self.min_interval
+        polls = 1
+
+        # Time spent neither capturing nor decoding is recorded as "wait"
+        self.busy = 0
+        wait_tic = self.timers.tic()
+
+        pixels, fingerprint = self.poll()
+        new_queue = self.decode(pixels)
+
+        # Colours that match no piece are mid animation, keep polling
+        while new_queue == queue or UNKNOWN_PIECE in new_queue:
+            if perf_counter() - start > self.timeout:
+                self.timeouts += 1
+                raise Queue_Timeout(
+                    f"queue unchanged after {self.timeout} s")
+
+            sleep(interval)
+            interval = min(interval * 1.5, self.max_interval)
+
+            pixels, new_fingerprint = self.poll()
+            polls += 1
+            if new_fingerprint != fingerprint:
+                fingerprint = new_fingerprint
+                new_queue = self.decode(pixels)
+
+        self.last_polls = polls
+        self.poll_counts[polls] += 1
+        if self.timers.enabled:
+            self.timers.record(
+                "wait", perf_counter() - wait_tic - self.busy)
+        return new_queue
@@ -0,0 +1,416 @@
+import heapq
+from time import perf_counter
+
+from Bitboard import *
+from Candidates import *
+from Transposition import *
+
+
+class Search_Timeout(Exception):
+    """
+    Raised when a search runs past its deadline.
+    """
+
+
+# ---------------------------------------------
+# BEAM SEARCH
+#   - Nodes are tuples of
+#       (score, clear_score, board, hold, index,
+#        root, key)
+#     where board is the bitboard packed by
+#     pack_bits, index points at the piece to
+#     play next in the piece sequence, root is
+#     the (move, packed board) of the first ply
+#     that lead to the node and key is the
+#     Zobrist hash of the board.
+#   - A packed board is one int of about 50
+#     bytes where a bitboard list is 20 ints of
+#     up to 500 bytes, so a beam and the
+#     transposition table hold packed boards
+#     and a node is unpacked only to expand it.
+#   - Nodes with the same key, hold and index
+#     are the same position reached through
+#     different moves, only the best is kept.
+# ---------------------------------------------
+def piece_sequence(current_piece, queue):
+    """
+    Build the known sequence of pieces, stopping at the first unknown one.
+
+    PARAMETERS
+    ----------
+    current_piece : string
+        piece that is about to be placed
+
+    queue : list[string]
+        upcoming pieces
+
+    RETURNS
+    -------
+    sequence : list[string]
+        current piece followed by the known queue
+    """
+    sequence = []
+    for piece in [current_piece] + list(queue):
+        if piece not in NUM_PIECE_STATES:
+            break
+        sequence.append(piece)
+    return sequence
+
+
+def evaluate_placement(rows, board, key, top, piece_key, col, weights,
+                       table):
+    """
+    Place a piece and evaluate the result, going through the transposition
+    table when there is one.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard before the placement
+
+    board : int
+        rows packed by pack_bits
+
+    key : int
+        Zobrist hash of rows
+
+    top : int
+        board row of the top of the piece
+
+    piece_key : string
+        piece and orientation, e.g. "T0"
+
+    col : int
+        leftmost column of the piece
+
+    weights : list[float]
+        heuristic weights for height difference, holes, cleared rows and
+        roughness
+
+    table : Transposition_Table or None
+        cache of evaluated boards
+
+    RETURNS
+    -------
+    evaluation : tuple(float, int, int, int)
+        heuristic evaluation, bitboard with filled rows removed packed by
+        pack_bits, number of rows cleared and Zobrist hash of the cleared
+        bitboard
+    """
+    masks = PIECE_MASKS[piece_key][col]
+    placed_key = key ^ zobrist_masks(top, masks)
+    if table is not None:
+        evaluation = table.get(placed_key)
+        if evaluation is not None:
+            return evaluation
+
+    cleared, clear_rows = clear_lines(place(rows, masks, top))
+    H = static_eval_bits(cleared, weights) + weights[2] * clear_rows
+    if clear_rows > 0:
+        cleared_key = zobrist_bits(cleared)
+        cleared_board = pack_bits(cleared)
+    else:
+        cleared_key = placed_key
+        cleared_board = board | (PIECE_PACKED[piece_key][col] >> (10 * top))
+
+    evaluation = (H, cleared_board, clear_rows, cleared_key)
+    if table is not None:
+        table.put(placed_key, evaluation)
+    return evaluation
+
+
+def expand(node, sequence, weights, table=None, bound=None, stats=None):
+    """
+    Generate the children of a node, placing either the next piece of the
+    sequence or swapping it with the hold piece.
+
+    PARAMETERS
+    ----------
+    node : tuple
+        (score, clear_score, board, hold, index, root, key)
+
+    sequence : list[string]
+        current piece followed by the known queue
+
+    weights : list[float]
+        heuristic weights for height difference, holes, cleared rows and
+        roughness
+
+    table : Transposition_Table or None
+        cache of evaluated boards
+
+    bound : float or None
+        children whose optimistic score is below bound are skipped before
+        they are evaluated, None keeps every child
+
+    stats : Prune_Stats or None
+        counts the skipped children
+
+    RETURNS
+    -------
+    generator of node
+        unique children of the node, in the order evaluate() visits moves
+    """
+    _, clear_score, board, hold, index, root, key = node
+    rows = unpack_bits(board)
+    current = sequence[index]
+
+    # Options are (hold_select, piece, (new hold, new index)), swapping
+    # with a hold piece equal to the current one changes nothing
+    options = [(False, current, (hold, index + 1))]
+    if hold in NUM_PIECE_STATES:
+        options.append((True, hold, (current, index + 1)))
+    elif hold == "" and index + 1 < len(sequence):
+        # Empty hold, the held piece is replaced by the next one in queue
+        options.append((True, sequence[index + 1], (current, index + 2)))
+
+    heights = column_heights(rows)
+    prune = (bound is not None and bounds_valid(weights)
+             and FULL_ROW not in rows)
+    if prune:
+        holes = holes_bits(rows)
+        row_fill = [POPCOUNT[row] for row in rows]
+
+    candidates = unique_candidates(heights, options)
+    for hold_select, states, piece_key, col, top, outcome in candidates:
+        if stats is not None:
+            stats.candidates += 1
+        if prune and clear_score + placement_bound(
+                holes, heights, row_fill, piece_key, col, top,
+                weights) < bound:
+            if stats is not None:
+                stats.pruned += 1
+            continue
+
+        H, cleared, clear_rows, cleared_key = evaluate_placement(
+            rows, board, key, top, piece_key, col, weights, table)
+        new_clear_score = clear_score + weights[2] * clear_rows
+        score = clear_score + H
+        if root is None:
+            child_root = ((states, col, hold_select), cleared)
+        else:
+            child_root = root
+        new_hold, new_index = outcome
+        yield (score, new_clear_score, cleared, new_hold, new_index,
+               child_root, cleared_key)
+
+
+def best_unique(nodes, beam_width):
+    """
+    Keep the first beam_width nodes of a sorted list, skipping positions
+    already kept. The first copy of a position has the best score, the
+    others only differ by how they got there.
+    """
+    beam = []
+    seen = set()
+    for node in nodes:
+        position = (node[6], node[3], node[4])
+        if position not in seen:
+            seen.add(position)
+            beam.append(node)
+            if len(beam) == beam_width:
+                break
+    return beam
+
+
+def expand_beam(beam, sequence, weights, keep, table=None, deadline=None,
+                stats=None, cancel=None):
+    """
+    Expand every node of a beam by one ply.
+
+    PARAMETERS
+    ----------
+    beam : list[node]
+        nodes to expand, see expand
+
+    sequence : list[string]
+        current piece followed by the known queue
+
+    weights : list[float]
+        heuristic weights
+
+    keep : int
+        number of positions the caller keeps. Once keep positions are
+        known, children that cannot beat the keep-th best are skipped
+
+    table : Transposition_Table or None
+        cache of evaluated boards
+
+    deadline : float or None
+        perf_counter() time by which the search must finish, raises
+        Search_Timeout if it is passed
+
+    stats : Prune_Stats or None
+        counts the children skipped by their optimistic bound
+
+    cancel : threading.Event or None
+        stops the search like a passed deadline once it is set
+
+    RETURNS
+    -------
+    children : list[node]
+        children of the nodes in beam order, unsorted
+    """
+    # Best score of every position so far
+    children = []
+    scores = {}
+    for node in beam:
+        if deadline is not None and perf_counter() > deadline:
+            raise Search_Timeout()
+        if cancel is not None and cancel.is_set():
+            raise Search_Timeout()
+        if node[4] >= len(sequence):
+            continue
+
+        bound = None
+        if len(scores) >= keep:
+            bound = heapq.nlargest(keep, scores.values())[-1]
+        for child in expand(node, sequence, weights, table, bound, stats):
+            children.append(child)
+            position = (child[6], child[3], child[4])
+            scores[position] = max(child[0], scores.get(position, child[0]))
+    return children
+
+
+def beam_search(rows, sequence, hold, weights, beam_width, beam_depth,
+                table=None, deadline=None, stats=None, cancel=None):
+    """
+    Search placements through the piece sequence, keeping only the best
+    beam_width nodes at every ply.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard of the current board
+
+    sequence : list[string]
+        current piece followed by the known queue
+
+    hold : string
+        piece that is currently being held, "" if none
+
+    weights : list[float]
+        heuristic weights for height difference, holes, cleared rows and
+        roughness
+
+    beam_width : int
+        number of nodes kept after every ply
+
+    beam_depth : int
+        number of pieces to place, limited by the known sequence
+
+    table : Transposition_Table or None
+        cache of evaluated boards, shared between searches
+
+    deadline : float or None
+        perf_counter() time by which the search must finish, raises
+        Search_Timeout if it is passed
+
+    stats : Prune_Stats or None
+        counts the children skipped by their optimistic bound
+
+    cancel : threading.Event or None
+        stops the search like a passed deadline once it is set
+
+    RETURNS
+    -------
+    move : tuple(int, int, bool) or None
+        (orientation, col, hold_select) of the best first move, None if no
+        piece can be placed
+
+    root_rows : list[int]
+        bitboard after the best first move
+
+    score : float
+        score of the best node found
+    """
+    beam = [(0, 0, pack_bits(rows), hold, 0, None, zobrist_bits(rows))]
+    best = None
+
+    for ply in range(beam_depth):
+        # Only the best node of the last ply is used
+        keep = 1 if ply == beam_depth - 1 else beam_width
+
+        children = expand_beam(beam, sequence, weights, keep, table,
+                               deadline, stats, cancel)
+        if len(children) == 0:
+            break
+
+        # Stable sort keeps the evaluate() order between equal scores
+        children.sort(key=lambda child: -child[0])
+        beam = best_unique(children, beam_width)
+        best = beam[0]
+
+    if best is None:
+        return None, rows, -99999
+
+    move, root_board = best[5]
+    return move, unpack_bits(root_board), best[0]
+
+
+def anytime_search(rows, sequence, hold, weights, beam_width, deadline,
+                   table=None, stats=None, cancel=None):
+    """
+    Iteratively deepen the beam search until the deadline or the end of
+    the known sequence. The one piece search always runs to completion, so
+    there is always an answer.
+
+    PARAMETERS
+    ----------
+    rows : list[int]
+        bitboard of the current board
+
+    sequence : list[string]
+        current piece followed by the known queue
+
+    hold : string
+        piece that is currently being held, "" if none
+
+    weights : list[float]
+        heuristic weights
+
+    beam_width : int
+        number of nodes kept after every ply
+
+    deadline : float
+        perf_counter() time by which a move is needed
+
+    table : Transposition_Table or None
+        cache of evaluated boards, lets every iteration reuse the
+        evaluations of the previous one
+
+    stats : Prune_Stats or None
+        counts the children skipped by their optimistic bound
+
+    cancel : threading.Event or None
+        stops the deepening once it is set, the deepest completed search
+        is returned
+
+    RETURNS
+    -------
+    move : tuple(int, int, bool) or None
+        (orientation, col, hold_select) of the best first move of the
+        deepest completed search
+
+    root_rows : list[int]
+        bitboard after the best first move
+
+    depth : int
+        depth of the deepest completed search
+    """
+    move, root_rows, _ = beam_search(
+        rows, sequence, hold, weights, beam_width, 1, table, stats=stats)
+    depth = 1
+
+    while depth < len(sequence) and perf_counter() < deadline:
+        if cancel is not None and cancel.is_set():
+            break
+        try:
+            result = beam_search(rows, sequence, hold, weights, beam_width,
+                                 depth + 1, table, deadline, stats, cancel)
+        except Search_Timeout:
+            break
+        move, root_rows, _ = result
+        depth += 1
+
+    return move, root_rows, depth
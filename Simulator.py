@@ -0,0 +1,240 @@
+import random
+from timeit import default_timer as timer
+
+from Board import *
+from Pieces import *
+
+
+class Tetris_Simulator:
+    """
+    A headless Tetris game for running the engine without TETR.IO.
+
+    Exposes the same state Tetris_Game reads from the screen and accepts
+    the moves Tetris_Game.evaluate() returns. Pieces are hard dropped from
+    the top of the board, like the moves the engine plays.
+
+    ATTRIBUTES
+    ----------
+    board : Board object
+        Board object containing board state
+
+    current_piece : string
+        piece that is about to be placed
+
+    hold_piece : string
+        piece that is currently being held
+
+    queue : list[string]
+        upcoming five pieces
+
+    game_over : bool
+        whether the stack has topped out
+
+    pieces_placed : int
+        number of pieces placed
+
+    lines_cleared : int
+        number of rows cleared
+
+    rng : Random
+        seeded random number generator of the randomiser
+
+    bag : list[string]
+        pieces left in the current 7-bag
+
+    garbage_interval : int
+        pieces between garbage rows, 0 for none
+
+    garbage_rng : Random
+        seeded random number generator of the garbage holes, separate so
+        garbage does not change the pieces
+
+    METHODS
+    -------
+    next_piece():
+        draw the next piece from the 7-bag randomiser
+
+    apply_move():
+        play a (orientation, col, hold_select) move
+
+    add_garbage():
+        push a garbage row in from the bottom
+    """
+
+    def __init__(self, seed=None, garbage_interval=0):
+        """
+        PARAMETERS
+        ----------
+        seed : int or None
+            seed of the randomiser, the same seed gives the same pieces
+            and garbage
+
+        garbage_interval : int
+            pieces between garbage rows, 0 for none
+        """
+        self.rng = random.Random(seed)
+        self.bag = []
+        self.garbage_interval = garbage_interval
+        self.garbage_rng = random.Random(
+            None if seed is None else f"garbage {seed}")
+
+        self.board = Board()
+        self.hold_piece = ""
+        self.current_piece = self.next_piece()
+        self.queue = [self.next_piece() for _ in range(5)]
+
+        self.game_over = False
+        self.pieces_placed = 0
+        self.lines_cleared = 0
+
+    def next_piece(self):
+        """
+        Draw the next piece, every run of seven holds each piece once.
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        piece : string
+            next piece
+        """
+        if len(self.bag) == 0:
+            self.bag = list("IOTSZJL")
+            self.rng.shuffle(self.bag)
+        return self.bag.pop()
+
+    def apply_move(self, orientation, col, hold_select):
+        """
+        Play a move and advance to the next piece.
+
+        PARAMETERS
+        ----------
+        orientation : int
+            orientation of the placed piece
+
+        col : int
+            leftmost column of the placed piece
+
+        hold_select : bool
+            whether the placed piece comes from hold, with an empty hold
+            the current piece is held and the first queue piece placed
+
+        RETURNS
+        -------
+        clear_rows : int
+            number of rows cleared by the move
+        """
+        if self.game_over:
+            return 0
+
+        piece = self.current_piece
+        if hold_select:
+            if self.hold_piece == "":
+                self.hold_piece = piece
+                piece = self.queue.pop(0)
+                self.queue.append(self.next_piece())
+            else:
+                piece, self.hold_piece = self.hold_piece, piece
+
+        piece_key = piece + str(orientation)
+        if (piece_key not in PIECE_SKIRT
+                or not 0 <= col <= 10 - len(PIECE_SKIRT[piece_key])):
+            self.game_over = True
+            return 0
+
+        valid_upper, _, found_valid = get_landing_row(
+            self.board.column_heights, piece_key, col)
+        if not found_valid:
+            self.game_over = True
+            return 0
+
+        self.board.place(valid_upper, col, piece_key)
+        clear_rows = self.board.clear_filled()
+        self.pieces_placed += 1
+        self.lines_cleared += clear_rows
+
+        if (self.garbage_interval > 0
+                and self.pieces_placed % self.garbage_interval == 0):
+            self.add_garbage()
+
+        self.current_piece = self.queue.pop(0)
+        self.queue.append(self.next_piece())
+
+        # Top out when the next piece cannot spawn
+        spawn_key = self.current_piece + "0"
+        spawn_col = 4 if self.current_piece == "O" else 3
+        for y, x in PIECE_CELLS[spawn_key]:
+            if self.board.board[y, spawn_col + x] > 0:
+                self.game_over = True
+
+        return clear_rows
+
+    def add_garbage(self):
+        """
+        Push a full row with one random hole in from the bottom, like the
+        garbage an opponent sends. The game is over if this pushes a filled
+        cell out of the top.
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        None
+        """
+        board = self.board.board
+        if numpy.any(board[0] > 0):
+            self.game_over = True
+
+        garbage = numpy.ones((1, 10), dtype=board.dtype)
+        garbage[0, self.garbage_rng.randrange(10)] = 0
+        self.board.board = numpy.vstack([board[1:], garbage])
+        self.board.update()
+
+
+def play_game(game, seed=None, max_pieces=1000, garbage_interval=0):
+    """
+    Let a Tetris_Game play a headless game.
+
+    PARAMETERS
+    ----------
+    game : Tetris_Game object
+        engine making the decisions, built with capture=False
+
+    seed : int or None
+        seed of the randomiser
+
+    max_pieces : int or None
+        number of pieces after which the game is stopped, None to play
+        until the stack tops out
+
+    garbage_interval : int
+        pieces between garbage rows, 0 for none
+
+    RETURNS
+    -------
+    stats : dict{string : float}
+        pieces placed, lines cleared, whether the game topped out and the
+        time spent deciding
+    """
+    simulator = Tetris_Simulator(seed, garbage_interval)
+    decision_time = 0
+
+    while not simulator.game_over and (
+            max_pieces is None or simulator.pieces_placed < max_pieces):
+        game.load_state(simulator)
+
+        tic = timer()
+        move = game.evaluate()
+        decision_time += timer() - tic
+
+        simulator.apply_move(*move)
+
+    return {
+        "pieces": simulator.pieces_placed,
+        "lines": simulator.lines_cleared,
+        "topped_out": simulator.game_over,
+        "decision_time": decision_time}
@@ -1,10 +1,91 @@
+import json
+import os
+
 import mss.tools
 import mss
 import numpy
+from time import perf_counter
 from PIL import Image
 from PIL import ImageOps
 
 from Board import *
+from Bitboard import *
+from Pieces import *
+from Search import *
+from Parallel_Search import *
+from Ponder import *
+from Instrumentation import *
+from Frame_Decoder import *
+from Game_State import *
+from Queue_Watcher import *
+from Capture_Service import *
+from Candidates import *
+from Kernels import *
+
+
+# ---------------------------------------------
+# HEURISTIC WEIGHTS
+#   - Height difference, holes, cleared rows and
+#     roughness. Tuned weights are saved to
+#     WEIGHTS_PATH by tune_weights.py and loaded
+#     at startup, the defaults are used without
+#     the file.
+#   - WEIGHTS_PATH sits next to this file, so the
+#     weights do not depend on the directory the
+#     engine is started from.
+# ---------------------------------------------
+DEFAULT_WEIGHTS = [0, 3, 2, 0.5]
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "weights.json")
+
+
+def load_weights(path=WEIGHTS_PATH):
+    """
+    Load heuristic weights saved by save_weights().
+
+    PARAMETERS
+    ----------
+    path : string
+        weights file
+
+    RETURNS
+    -------
+    weights : list[float]
+        weights from the file, DEFAULT_WEIGHTS if it does not exist
+    """
+    if not os.path.exists(path):
+        return list(DEFAULT_WEIGHTS)
+    with open(path) as weights_file:
+        weights = json.load(weights_file)["weights"]
+    if len(weights) != len(DEFAULT_WEIGHTS):
+        raise ValueError(f"{path} has {len(weights)} weights, expected "
+                         f"{len(DEFAULT_WEIGHTS)}")
+    return [float(weight) for weight in weights]
+
+
+def save_weights(weights, path=WEIGHTS_PATH, **info):
+    """
+    Save heuristic weights for load_weights().
+
+    PARAMETERS
+    ----------
+    weights : list[float]
+        heuristic weights
+
+    path : string
+        weights file, overwritten if it exists
+
+    info : dict
+        anything else to keep with the weights, e.g. how they were tuned
+
+    RETURNS
+    -------
+    None
+    """
+    data = {"weights": [float(weight) for weight in weights]}
+    data.update(info)
+    with open(path, "w") as weights_file:
+        json.dump(data, weights_file, indent=2)
 
 
 def print_board(b):
@@ -39,13 +120,28 @@ class Tetris_Game:
 
     ATTRIBUTES
     ----------
+    beam_depth : int
+        number of pieces the beam search places
+
+    beam_width : int
+        number of nodes kept at every ply of the beam search
+
     board : Board object
         Board object containing board state, i.e. the state of previously 
         placed pieces
 
+    capture_service : Capture_Service object
+        background capture and decode, None when capturing synchronously
+
     current_piece : string
         piece that is about to be placed
 
+    decoder : Frame_Decoder object
+        reads the board, hold, current piece and queue from a screenshot
+
+    engine : string
+        search backend used by evaluate()
+
     hold_piece : string
         piece that is currently being held
 
@@ -61,11 +157,46 @@ class Tetris_Game:
     piece_shape : dict{string : numpy.array(float)}
         contains a numpy representation of each rotation for every piece
 
+    pool : Search_Pool object
+        worker processes of the parallel engine
+
+    ponderer : Ponderer object
+        background search of the next position, None if not pondering
+
+    prune_stats : Prune_Stats object
+        candidates cut by their optimistic bound before the full heuristic
+
     queue : list[string]
         upcoming five pieces
 
     sct : MSS
-        mss instance for screenshots
+        mss instance for screenshots, None when not capturing
+
+    scratch : tuple(numpy.array)
+        buffers the jit engine scores candidates in
+
+    search_depth : int
+        depth reached by the last anytime search
+
+    table : Transposition_Table object
+        cache of evaluated boards keyed by Zobrist hash
+
+    table_size : int
+        number of evaluated boards kept by the table, the table of every
+        parallel worker and the background search
+
+    timers : Stage_Timer object
+        per stage latency histograms, disabled by default
+
+    watcher : Queue_Watcher object
+        waits for the queue to change, None when not capturing
+
+    weights : list[float]
+        heuristic weights for height difference, holes, cleared rows and
+        roughness
+
+    workers : int
+        number of processes used by the parallel engine
 
     METHODS
     -------
@@ -73,17 +204,66 @@ class Tetris_Game:
         inital update to get current and hold pieces, queue, and board
     
     update():
-        update board state
+        wait for the next piece and update the queue
+
+    wait_for_capture():
+        wait for the capture thread to publish a new queue
+
+    load_state():
+        copy the game state from a simulator or log instead of the screen
+
+    set_weights():
+        change the heuristic weights
+
+    state():
+        immutable Game_State snapshot of the game
 
     simulate_piece():
-        for a given piece, simulate it's placement on the board
+        for a given piece, simulate it's placement on the board by scanning
+        rows, evaluate() lands pieces with get_landing_row() instead
 
     calculate_heuristic():
         for a given board state, find the heuristic evaluation
 
+    calculate_heuristic_incremental():
+        calculate_heuristic() from incrementally maintained board features
+
     evaluate():
         find the best move for a given current piece
 
+    search():
+        run the selected search engine
+
+    candidates():
+        unique placements of the current and hold piece
+
+    evaluate_numpy():
+        the original one candidate at a time search
+
+    evaluate_bitboard():
+        evaluate() using the bitboard kernels
+
+    calculate_heuristic_batch():
+        calculate_heuristic() for a batch of boards
+
+    evaluate_batched():
+        evaluate() scoring all candidates in one numpy pass
+
+    evaluate_beam():
+        beam search over the queue and hold
+
+    evaluate_parallel():
+        beam search with root moves split across worker processes
+
+    evaluate_anytime():
+        beam search deepened until a deadline
+
+    evaluate_jit():
+        evaluate() with compiled Numba kernels
+
+    commit_move():
+        apply a chosen move to the board, current/hold piece and queue
+
     generate_moves():
         for a given "best move" find the sequence of key presses that
         execute the move
@@ -92,15 +272,58 @@ class Tetris_Game:
         prints the tetris board, current/hold piece and queue
     """
 
-    def __init__(self):
+    def __init__(self, engine="numpy", beam_width=8, beam_depth=3,
+                 table_size=2 ** 16, workers=1, ponder_time=0,
+                 capture=True, capture_rate=None, weights=None, timers=None):
         """
         Constructs all the necessary attributes the board.
 
         PARAMETERS
         ----------
-        NONE
+        engine : string
+            search backend used by evaluate(), "numpy", "bitboard",
+            "batched", "beam", "parallel", "anytime" or "jit", which falls
+            back to "numpy" without Numba
+
+        beam_width : int
+            number of nodes kept at every ply of the beam search
+
+        beam_depth : int
+            number of pieces the beam search places
+
+        table_size : int
+            number of evaluated boards kept in the transposition table
+
+        workers : int
+            number of processes used by the parallel engine, 1 or less
+            searches sequentially
+
+        ponder_time : float
+            seconds spent searching the next position in the background
+            after each move, 0 disables pondering
+
+        capture : bool
+            whether to capture the screen, False for headless runs where
+            the state is set with load_state()
+
+        capture_rate : float or None
+            captures per second of a background Capture_Service, 0 for as
+            fast as possible, None captures synchronously in update()
+
+        weights : list[float] or None
+            heuristic weights, None loads them from WEIGHTS_PATH
+
+        timers : Stage_Timer object or None
+            per stage latencies, shared with the queue watcher and the
+            capture thread, None disables them
         """
-        self.sct = mss.mss()
+        # Per stage latencies, recorded by the capture code as well
+        self.timers = timers if timers is not None else Stage_Timer()
+
+        if capture:
+            self.sct = mss.mss()
+        else:
+            self.sct = None
         self.monitor_full_board = {
             "top": 58,
             "left": 589,
@@ -112,26 +335,27 @@ class Tetris_Game:
             "width": 146,
             "height": 72}
 
-        self.piece_colour = {}
-        self.piece_colour[166] = "S"
-        self.piece_colour[165] = "S"
-        self.piece_colour[136] = "L"
-        self.piece_colour[152] = "I"
-        self.piece_colour[153] = "I"
-        self.piece_colour[170] = "O"
-        self.piece_colour[171] = "O"
-        self.piece_colour[121] = "T"
-        self.piece_colour[99] = "J"
-        self.piece_colour[98] = "J"
-        self.piece_colour[110] = "Z"
-        self.piece_colour[109] = "Z"
-        self.piece_colour[218] = "S"
-        self.piece_colour[180] = "L"
-        self.piece_colour[200] = "I"
-        self.piece_colour[220] = "O"
-        self.piece_colour[161] = "T"
-        self.piece_colour[131] = "J"
-        self.piece_colour[145] = "Z"
+        self.piece_colour = PIECE_COLOUR
+
+        # Samples the screenshot pixels the state is read from
+        self.decoder = Frame_Decoder(self.piece_colour)
+
+        # Polls the queue for the next piece
+        if capture:
+            self.watcher = Queue_Watcher(
+                self.sct, self.monitor_full_board, self.decoder,
+                timers=self.timers)
+        else:
+            self.watcher = None
+
+        # Background capture, update() then reads its latest state
+        if capture and capture_rate is not None:
+            self.capture_service = Capture_Service(
+                self.monitor_full_board, self.decoder, capture_rate,
+                timers=self.timers)
+            self.capture_service.start()
+        else:
+            self.capture_service = None
 
         # 20 is number of rows, 10 is number of cols
         self.board = Board()
@@ -139,71 +363,50 @@ class Tetris_Game:
         self.hold_piece = ""
         self.queue = ["", "", "", "", ""]
 
-        # Define shape of all pieces
-        #   Pieces will be defined from state 0: horizontal
-        #   Then rotated counterclockwise until no new states are found
-        #   Piece state denoted by "{piece}{state_number}", e.g. L0, L1
-        # Eventually convert this to something I can read in
-        self.piece_shape = {}
-        self.piece_shape["I0"] = numpy.ones([1, 4])
-        self.piece_shape["I1"] = numpy.ones([4, 1])
-
-        self.piece_shape["O0"] = numpy.ones([2, 2])
-
-        self.piece_shape["T0"] = numpy.array([[0, 1, 0],
-                                              [1, 1, 1]])
-        self.piece_shape["T1"] = numpy.array([[0, 1],
-                                              [1, 1],
-                                              [0, 1]])
-        self.piece_shape["T2"] = numpy.array([[1, 1, 1],
-                                              [0, 1, 0]])
-        self.piece_shape["T3"] = numpy.array([[1, 0],
-                                              [1, 1],
-                                              [1, 0]])
-
-        self.piece_shape["S0"] = numpy.array([[0, 1, 1],
-                                              [1, 1, 0]])
-        self.piece_shape["S1"] = numpy.array([[1, 0],
-                                              [1, 1],
-                                              [0, 1]])
-
-        self.piece_shape["Z0"] = numpy.array([[1, 1, 0],
-                                              [0, 1, 1]])
-        self.piece_shape["Z1"] = numpy.array([[0, 1],
-                                              [1, 1],
-                                              [1, 0]])
-
-        self.piece_shape["J0"] = numpy.array([[1, 0, 0],
-                                              [1, 1, 1]])
-        self.piece_shape["J1"] = numpy.array([[0, 1],
-                                              [0, 1],
-                                              [1, 1]])
-        self.piece_shape["J2"] = numpy.array([[1, 1, 1],
-                                              [0, 0, 1]])
-        self.piece_shape["J3"] = numpy.array([[1, 1],
-                                              [1, 0],
-                                              [1, 0]])
-
-        self.piece_shape["L0"] = numpy.array([[0, 0, 1],
-                                              [1, 1, 1]])
-        self.piece_shape["L1"] = numpy.array([[1, 1],
-                                              [0, 1],
-                                              [0, 1]])
-        self.piece_shape["L2"] = numpy.array([[1, 1, 1],
-                                              [1, 0, 0]])
-        self.piece_shape["L3"] = numpy.array([[1, 0],
-                                              [1, 0],
-                                              [1, 1]])
+        # Define shape of all pieces, see Pieces.py
+        self.piece_shape = PIECE_SHAPE
 
         # The number of rotated states a piece can take
-        self.num_piece_states = {}
-        self.num_piece_states["I"] = 2
-        self.num_piece_states["O"] = 1
-        self.num_piece_states["T"] = 4
-        self.num_piece_states["S"] = 2
-        self.num_piece_states["Z"] = 2
-        self.num_piece_states["J"] = 4
-        self.num_piece_states["L"] = 4
+        self.num_piece_states = NUM_PIECE_STATES
+
+        # Search backend and heuristic weights
+        self.engine = engine
+        if engine == "jit" and NUMBA_AVAILABLE:
+            # Compile the kernels now rather than on the first piece
+            warm_up()
+
+        # Buffers the jit engine scores candidates in, reused every piece
+        self.scratch = scratch_buffers()
+        if weights is None:
+            weights = load_weights()
+        self.weights = list(weights)
+        self.beam_width = beam_width
+        self.beam_depth = beam_depth
+        self.search_depth = 0
+
+        # Evaluated boards, kept between decisions. Holds evaluations for
+        # the current weights only, clear it when they change
+        self.table_size = table_size
+        self.table = Transposition_Table(table_size)
+
+        # Candidates cut by their optimistic bound, see Candidates.py
+        self.prune_stats = Prune_Stats()
+
+        # Worker processes of the parallel engine, started on first use
+        self.workers = workers
+        self.pool = None
+
+        # Background search of the next position
+        if ponder_time > 0:
+            # The parallel engine plays the same moves as the beam engine,
+            # which needs no worker processes on a background thread
+            ponder_engine = "beam" if engine == "parallel" else engine
+            self.ponderer = Ponderer(
+                Tetris_Game(ponder_engine, beam_width, beam_depth,
+                            table_size, capture=False, weights=self.weights),
+                ponder_time)
+        else:
+            self.ponderer = None
 
     def init_update(self):
         """
@@ -219,51 +422,25 @@ class Tetris_Game:
         None
         """
         # Get screenshot of the board, including queue, current piece and hold
-        board_picture_bgra = self.sct.grab(self.monitor_full_board)
-        board_picture_rgb = Image.frombytes(
-            "RGB",
-            board_picture_bgra.size,
-            board_picture_bgra.bgra,
-            "raw",
-            "BGRX")
-        board_picture_bw = ImageOps.grayscale(board_picture_rgb)
-
-        # Find board layout from screenshot
-        for y in range(20):  # ITERATE ROWS
-            for x in range(10):  # ITERATE COLS
-                pix = board_picture_bw.getpixel((207 + 36 * x, 127 + 36 * y))
-                if pix > 40:
-                    self.board.update_state(y, x, 1)
-                else:
-                    self.board.update_state(y, x, 0)
+        tic = self.timers.tic()
+        board_picture = self.sct.grab(self.monitor_full_board)
+        self.timers.toc("capture", tic)
+
+        # Find board layout, hold piece, current piece and queue from
+        # screenshot
+        tic = self.timers.tic()
+        board, self.hold_piece, self.current_piece, self.queue = \
+            self.decoder.decode(board_picture)
+        self.timers.toc("decode", tic)
+        self.board.board = board
         self.board.update()
 
-        # Get hold piece
-        hold_pix = board_picture_bw.getpixel((98, 199))
-        if hold_pix == 0:  # No piece in hold
-            self.hold_piece = ""
-        elif hold_pix > 0 and hold_pix < 90:  # Piece just held
-            self.hold_piece = "U"
-        else:  # Piece in hold
-            self.hold_piece = self.piece_colour[hold_pix]
-
-        # Get current piece
-        current_pix = board_picture_bw.getpixel((356, 38))
-        if current_pix == 0:
-            self.current_piece = ""
-        else:
-            self.current_piece = self.piece_colour[current_pix]
-
-        # Get current queue
-        for i in range(5):
-            queue_pix = board_picture_bw.getpixel((650, 199 + 109 * i))
-            self.queue[i] = self.piece_colour[queue_pix]
-
         self.board.update()
 
     def update(self):
         """
-        Function to get board state at any time
+        Function to get board state at any time. Raises Queue_Timeout when
+        the queue stops changing, e.g. at the end of a game
 
         PARAMETERS
         ----------
@@ -273,46 +450,47 @@ class Tetris_Game:
         -------
         None
         """
-        # Get screenshot of the board, including queue, current piece and hold
-        board_picture_bgra = self.sct.grab(self.monitor_full_board)
-        board_picture_rgb = Image.frombytes(
-            "RGB",
-            board_picture_bgra.size,
-            board_picture_bgra.bgra,
-            "raw",
-            "BGRX")
-        board_picture_bw = ImageOps.grayscale(board_picture_rgb)
-        # board_picture_bw.save("test_pic.png")
-
         self.current_piece = self.queue[0]
 
-        temp_queue = ["", "", "", "", ""]
-
-        # Get current queue
-        for i in range(5):
-            queue_pix = board_picture_bw.getpixel((650, 199 + 109 * i))
-            temp_queue[i] = self.piece_colour[queue_pix]
+        # Wait for the queue to move on, polling only the queue pixels or
+        # reading the states published by the capture thread. The watcher
+        # and the capture thread record "capture" and "decode" themselves,
+        # "wait" is the time spent doing neither
+        if self.capture_service is not None:
+            tic = self.timers.tic()
+            self.queue = self.wait_for_capture()
+            self.timers.toc("wait", tic)
+        else:
+            self.queue = self.watcher.wait_for_change(self.queue)
 
-        if self.queue == temp_queue:
-            while self.queue == temp_queue:
-                # print("STINKY")
-                board_picture_bgra = self.sct.grab(self.monitor_full_board)
-                board_picture_rgb = Image.frombytes(
-                    "RGB",
-                    board_picture_bgra.size,
-                    board_picture_bgra.bgra,
-                    "raw",
-                    "BGRX")
-                board_picture_bw = ImageOps.grayscale(board_picture_rgb)
+        # queue_pix = board_picture_bw.getpixel((76, 39))
+        # self.queue.append(self.piece_colour[queue_pix])
 
-                for i in range(5):
-                    queue_pix = board_picture_bw.getpixel((650, 199 + 109 * i))
-                    temp_queue[i] = self.piece_colour[queue_pix]
+    def wait_for_capture(self):
+        """
+        Wait until the capture thread publishes a queue that differs from
+        the current one. Raises Queue_Timeout like the Queue_Watcher
 
-        self.queue = temp_queue
+        PARAMETERS
+        ----------
+        None
 
-        # queue_pix = board_picture_bw.getpixel((76, 39))
-        # self.queue.append(self.piece_colour[queue_pix])
+        RETURNS
+        -------
+        queue : list[string]
+            queue on screen once it has changed
+        """
+        start = perf_counter()
+        sequence, state = self.capture_service.latest()
+        while state is None or state[3] == self.queue:
+            remaining = self.watcher.timeout - (perf_counter() - start)
+            if remaining <= 0:
+                self.watcher.timeouts += 1
+                raise Queue_Timeout(
+                    f"queue unchanged after {self.watcher.timeout} s")
+            sequence, state = self.capture_service.wait_newer(
+                sequence, remaining)
+        return state[3]
 
     def update_old(self):
         """
@@ -327,45 +505,80 @@ class Tetris_Game:
         None
         """
         # Get screenshot of the board, including queue, current piece and hold
-        board_picture_bgra = self.sct.grab(self.monitor_full_board)
-        board_picture_rgb = Image.frombytes(
-            "RGB",
-            board_picture_bgra.size,
-            board_picture_bgra.bgra,
-            "raw",
-            "BGRX")
-        board_picture_bw = ImageOps.grayscale(board_picture_rgb)
-
-        # Find board layout from screenshot
-        for y in range(20):  # ITERATE ROWS
-            for x in range(10):  # ITERATE COLS
-                pix = board_picture_bw.getpixel((207 + 36 * x, 127 + 36 * y))
-                if pix > 40:
-                    self.board.update_state(y, x, 1)
-                else:
-                    self.board.update_state(y, x, 0)
+        board_picture = self.sct.grab(self.monitor_full_board)
+
+        # Find board layout, hold piece, current piece and queue from
+        # screenshot
+        board, self.hold_piece, self.current_piece, self.queue = \
+            self.decoder.decode(board_picture)
+        self.board.board = board
         self.board.update()
 
-        # Get hold piece
-        hold_pix = board_picture_bw.getpixel((98, 199))
-        if hold_pix == 0:  # No piece in hold
-            self.hold_piece = ""
-        elif hold_pix > 0 and hold_pix < 90:  # Piece just held
-            self.hold_piece = "U"
-        else:  # Piece in hold
-            self.hold_piece = self.piece_colour[hold_pix]
-
-        # Get current piece
-        current_pix = board_picture_bw.getpixel((356, 38))
-        if current_pix == 0:
-            self.current_piece = ""
-        else:
-            self.current_piece = self.piece_colour[current_pix]
+    def load_state(self, source):
+        """
+        Copy the game state from another source than the screen, e.g. a
+        Tetris_Simulator or a logged position.
+
+        PARAMETERS
+        ----------
+        source : object or Game_State
+            has board, current_piece, hold_piece and queue attributes like
+            this class
 
-        # Get current queue
-        for i in range(5):
-            queue_pix = board_picture_bw.getpixel((650, 199 + 109 * i))
-            self.queue[i] = self.piece_colour[queue_pix]
+        RETURNS
+        -------
+        None
+        """
+        if isinstance(source, Game_State):
+            self.board = Board()
+            self.board.board = source.to_array()
+            self.board.update()
+            self.current_piece = source.current_piece
+            self.hold_piece = source.hold_piece
+            self.queue = source.queue_pieces
+            return
+
+        self.board = source.board.copy()
+        self.current_piece = source.current_piece
+        self.hold_piece = source.hold_piece
+        self.queue = list(source.queue)
+
+    def set_weights(self, weights):
+        """
+        Change the heuristic weights, dropping everything evaluated with
+        the old ones.
+
+        PARAMETERS
+        ----------
+        weights : list[float]
+            heuristic weights
+
+        RETURNS
+        -------
+        None
+        """
+        self.weights = list(weights)
+        self.table.clear()
+        if self.ponderer is not None:
+            # A pondered result was searched with the old weights
+            self.ponderer.stop()
+            self.ponderer.state = None
+            self.ponderer.game.set_weights(self.weights)
+        if self.pool is not None:
+            # The workers' tables hold evaluations for the old weights
+            self.pool.shutdown()
+            self.pool = None
+
+    def state(self):
+        """
+        Immutable snapshot of the board and pieces.
+
+        RETURNS
+        -------
+        state : Game_State
+            hashable state, e.g. to key caches or send to other processes
+        """
+        return Game_State.from_game(self)
 
     def simulate_piece(self, board, piece, piece_shape, max_row, col):
         """
@@ -444,7 +657,7 @@ class Tetris_Game:
         roughness = get_roughness(cleared_board)
 
         # Calculate H function
-        weights = [0, 3, 2, 0.5]
+        weights = self.weights
 
         # print(f"Holes: {num_holes}")
         # print(f"Clear Rows: {clear_rows}")
@@ -457,103 +670,547 @@ class Tetris_Game:
 
         return H, cleared_board
 
-    def evaluate(self):
+    def calculate_heuristic_incremental(self, upper, col, piece_key):
+        """
+        calculate_heuristic() for a piece placed on the current board, using
+        the features Board maintains instead of rescanning the board. The
+        piece is played with make() and taken back with unmake(), so
+        nothing is copied.
+
+        The transposition table is not used. A one piece search on a new
+        board rarely hits it, and every entry would be kept per candidate.
+
+        PARAMETERS
+        ----------
+        upper : int
+            board row of the top of the piece
+
+        col : int
+            leftmost column of the piece
+
+        piece_key : string
+            piece and orientation, e.g. "T0"
+
+        RETURNS
+        -------
+        H : float
+            heuristic evaluation
+        """
+        board = self.board
+        clear_rows = board.make(upper, col, piece_key)
+
+        height_diff = board.min_row - board.max_row
+
+        # H(s) = - w0*D(s) - w1*O(s) + w2*C(s) - w3*R(s)
+        weights = self.weights
+        H = - weights[0] * height_diff - weights[1] * \
+            board.number_of_holes + weights[2] * clear_rows - \
+            weights[3] * board.roughness
+
+        board.unmake()
+        return H
+
+    def calculate_heuristic_batch(self, boards):
+        """
+        calculate_heuristic() for a whole batch of boards at once.
+
+        PARAMETERS
+        ----------
+        boards : numpy.array(float)
+            (N, 20, 10) batch of boards with the candidate pieces placed
+
+        RETURNS
+        -------
+        H : numpy.array(float)
+            heuristic evaluation of each board
+
+        cleared_boards : numpy.array(float)
+            (N, 20, 10) batch with filled rows cleared
+        """
+        cleared_boards, clear_rows = clear_filled_rows_batch(boards)
+        max_row, min_row, num_holes, roughness = get_features_batch(
+            cleared_boards)
+        height_diff = min_row - max_row
+
+        # H(s) = - w0*D(s) - w1*O(s) + w2*C(s) - w3*R(s)
+        weights = self.weights
+        H = - weights[0] * height_diff - weights[1] * \
+            num_holes + weights[2] * clear_rows - weights[3] * roughness
+
+        return H, cleared_boards
+
+    def evaluate(self, deadline=None):
         """
         BRUH
+
+        The anytime engine searches until deadline, a perf_counter() time.
+        When pondering, a matching background result is played straight
+        away and the next position is pondered once the move is chosen.
         """
-        # Get number of possible orientations
-        num_states = self.num_piece_states[self.current_piece]
+        if self.ponderer is None:
+            return self.search(deadline)
 
-        # Get current max and min row of the board
-        max_row = self.board.max_row
-        min_row = self.board.min_row
+        pondered = self.ponderer.take(self.state())
 
-        # create a board to mess around with
-        board_copy = numpy.copy(self.board.board)
+        if pondered is None:
+            move = self.search(deadline)
+        else:
+            move, root_rows = pondered
+            if self.hold_piece == "":
+                hold_option = self.queue[0]
+            else:
+                hold_option = self.hold_piece
+            self.commit_move(to_array(root_rows), move[2], hold_option)
+
+        # The next current piece is the first in queue, the rest of the
+        # queue is known except for the piece that will appear at its end
+        self.ponderer.start(
+            to_bitboard(self.board.board),
+            self.queue[0],
+            self.hold_piece,
+            self.queue[1:])
+        return move
+
+    def search(self, deadline=None, cancel=None):
+        """
+        Run the search engine selected by engine.
 
+        A set cancel Event stops the beam searches, the anytime engine plays
+        its deepest completed search and the beam engine raises
+        Search_Timeout. The one piece engines finish regardless.
+        """
+        if self.engine == "bitboard":
+            return self.evaluate_bitboard()
+        if self.engine == "batched":
+            return self.evaluate_batched()
+        if self.engine == "beam":
+            return self.evaluate_beam(cancel)
+        if self.engine == "parallel":
+            return self.evaluate_parallel()
+        if self.engine == "anytime":
+            return self.evaluate_anytime(deadline, cancel)
+        if self.engine == "jit" and NUMBA_AVAILABLE:
+            return self.evaluate_jit()
+        return self.evaluate_numpy()
+
+    def candidates(self):
+        """
+        Unique placements of the current piece and the hold option.
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        hold_option : string
+            piece played when holding, the first queue piece if the hold is
+            empty
+
+        candidates : generator
+            (hold_select, orientation, piece_key, col, upper, outcome) of
+            every candidate, see unique_candidates
+        """
+        # Get hold piece
+        if self.hold_piece == "":
+            hold_option = self.queue[0]
+        else:
+            hold_option = self.hold_piece
+
+        # Only the board is scored, so both options have the same outcome
+        options = ((False, self.current_piece, None),
+                   (True, hold_option, None))
+        return hold_option, unique_candidates(self.board.column_heights,
+                                              options)
+
+    def evaluate_numpy(self):
+        """
+        Find the best move for the current piece and hold piece, one
+        candidate at a time. Candidates are played on the board itself
+        with make() and unmake().
+        """
         # Set Heuristic to minimum
         H = -99999
 
-        # copy a board to store the best move
-        # redundant while board is screenshot every frame
-        best_move = numpy.copy(self.board.board)
+        # Best placement, played once all candidates are scored
+        best_key = None
+        best_upper = 0
         best_orientation = 0
         best_col = 0
         hold_select = False
 
-        # Iterate through all current piece rotations
-        for states in range(num_states):
-            # Get the piece and the shape of the piece
-            piece = self.piece_shape[self.current_piece + str(states)]
-            piece_shape = numpy.shape(piece)
+        # Holes and cleared rows are cheap to know before playing a
+        # candidate, candidates whose bound cannot beat the best so far
+        # skip the rest of the heuristic
+        column_heights = self.board.column_heights
+        row_fill = self.board.row_fill
+        holes = self.board.number_of_holes
+        prune = bounds_valid(self.weights) and 10 not in row_fill
+        stats = self.prune_stats
+
+        hold_option, candidates = self.candidates()
+        for hold, states, piece_key, col, valid_upper, _ in candidates:
+            stats.candidates += 1
+            if prune and placement_bound(
+                    holes, column_heights, row_fill, piece_key, col,
+                    valid_upper, self.weights) <= H:
+                stats.pruned += 1
+                continue
+
+            H_new = self.calculate_heuristic_incremental(
+                valid_upper, col, piece_key)
+
+            if H_new > H:
+                H = H_new
+                best_key = piece_key
+                best_upper = valid_upper
+                best_orientation = states
+                best_col = col
+                hold_select = hold
+
+        # Play the best placement for good
+        if best_key is not None:
+            self.board.make(best_upper, best_col, best_key)
+            self.board.clear_undo()
+
+        self.commit_move(self.board.board, hold_select, hold_option)
+        return best_orientation, best_col, hold_select
 
-            # Calculate the number of places it can go
-            num_moves = int((10 - piece_shape[1]) / 1 + 1)
+    def evaluate_jit(self):
+        """
+        Find the best move for the current piece with the compiled kernels
+        of Kernels.py, scoring every orientation and column of a piece in
+        one call. Visits moves in the same order as evaluate_numpy(), so
+        both return the same move.
 
-            for col in range(num_moves):
-                valid_upper, valid_lower, found_valid = self.simulate_piece(
-                    board_copy, piece, piece_shape, max_row, col)
+        PARAMETERS
+        ----------
+        None
 
-                if found_valid:
-                    # Place piece on board
-                    board_copy[valid_upper:valid_lower,
-                               col:col + piece_shape[1]] += piece
+        RETURNS
+        -------
+        best_orientation : int
+            orientation of the best move
 
-                    H_new, cleared_board = self.calculate_heuristic(
-                        board_copy, max_row)
+        best_col : int
+            leftmost column of the best move
 
-                    if H_new > H:
-                        H = H_new
-                        best_move = numpy.copy(cleared_board)
+        hold_select : bool
+            whether the hold piece is used
+        """
+        board = self.board.board
+        weights = numpy.array(self.weights, dtype=float)
+        scores, valid, scratch, tops = self.scratch
+
+        # Get hold piece
+        if self.hold_piece == "":
+            hold_option = self.queue[0]
+        else:
+            hold_option = self.hold_piece
+
+        H = -99999
+        best_piece = None
+        best_orientation = 0
+        best_col = 0
+        hold_select = False
+
+        # The kernel scores a whole piece, so duplicates are dropped per
+        # piece rather than per placement
+        options = unique_options(((False, self.current_piece, None),
+                                  (True, hold_option, None)))
+        for hold, piece, _ in options:
+            cells, skirts, widths, heights = PIECE_ARRAYS[piece]
+            score_placements_kernel(board, cells, skirts, widths, heights,
+                                    weights, scores, valid, scratch, tops)
+
+            for states in range(len(cells)):
+                for col in range(11 - widths[states]):
+                    if valid[states, col] and scores[states, col] > H:
+                        H = scores[states, col]
+                        best_piece = piece
                         best_orientation = states
                         best_col = col
+                        hold_select = hold
 
-                    board_copy[valid_upper:valid_lower,
-                               col:col + piece_shape[1]] -= piece
+        if best_piece is None:
+            best_move = numpy.copy(board)
+        else:
+            best_move = place_piece(board, best_piece, best_orientation,
+                                    best_col)
+        self.commit_move(best_move, hold_select, hold_option)
+        return best_orientation, best_col, hold_select
+
+    def evaluate_bitboard(self):
+        """
+        Find the best move for the current piece using the bitboard kernels.
+        Considers the same placements in the same order as evaluate(), so
+        both return the same move.
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        best_orientation : int
+            orientation of the best move
+
+        best_col : int
+            leftmost column of the best move
+
+        hold_select : bool
+            whether the hold piece is used
+        """
+        rows = to_bitboard(self.board.board)
+        key = self.board.hash
+
+        board = pack_bits(rows)
+
+        H = -99999
+        best_board = board
+        best_orientation = 0
+        best_col = 0
+        hold_select = False
+
+        # Same bounds as evaluate_numpy()
+        column_heights = self.board.column_heights
+        row_fill = self.board.row_fill
+        holes = self.board.number_of_holes
+        prune = bounds_valid(self.weights) and 10 not in row_fill
+        stats = self.prune_stats
+
+        hold_option, candidates = self.candidates()
+        for hold, states, piece_key, col, top, _ in candidates:
+            stats.candidates += 1
+            if prune and placement_bound(
+                    holes, column_heights, row_fill, piece_key, col, top,
+                    self.weights) <= H:
+                stats.pruned += 1
+                continue
+
+            H_new, cleared, _, _ = evaluate_placement(
+                rows, board, key, top, piece_key, col, self.weights,
+                self.table)
+
+            if H_new > H:
+                H = H_new
+                best_board = cleared
+                best_orientation = states
+                best_col = col
+                hold_select = hold
+
+        self.commit_move(to_array(unpack_bits(best_board)), hold_select,
+                         hold_option)
+        return best_orientation, best_col, hold_select
+
+    def evaluate_batched(self):
+        """
+        Find the best move for the current piece by scoring every candidate
+        placement of the current and hold piece in one batch. Candidates are
+        stacked in the same order evaluate() visits them, so both return the
+        same move.
+
+        PARAMETERS
+        ----------
+        None
+
+        RETURNS
+        -------
+        best_orientation : int
+            orientation of the best move
 
-        # Consider hold piece
-        #   Will add a threshold to consider using hold piece so it's not checked
-        #   every single time for trivial choices
+        best_col : int
+            leftmost column of the best move
 
+        hold_select : bool
+            whether the hold piece is used
+        """
+        # Collect every valid placement and the flat index of its cells
+        moves = []
+        cells = []
+        hold_option, candidates = self.candidates()
+        for hold, states, piece_key, col, valid_upper, _ in candidates:
+            moves.append((states, col, hold))
+            cells.extend((valid_upper + y) * 10 + col + x
+                         for y, x in PIECE_CELLS[piece_key])
+
+        if len(moves) == 0:
+            self.commit_move(numpy.copy(self.board.board), False, hold_option)
+            return 0, 0, False
+
+        # Place every candidate on its own copy of the board in one pass
+        boards = numpy.repeat(
+            self.board.board.reshape(1, 200), len(moves), axis=0)
+        boards[numpy.repeat(numpy.arange(len(moves)), 4), cells] = 1
+        boards = boards.reshape(len(moves), 20, 10)
+
+        H, cleared_boards = self.calculate_heuristic_batch(boards)
+        best = int(numpy.argmax(H))
+        best_orientation, best_col, hold_select = moves[best]
+
+        self.commit_move(cleared_boards[best], hold_select, hold_option)
+        return best_orientation, best_col, hold_select
+
+    def evaluate_beam(self, cancel=None):
+        """
+        Find the best move for the current piece with a beam search through
+        the queue, including hold swaps. With a beam depth of 1 it picks the
+        same move as evaluate().
+
+        PARAMETERS
+        ----------
+        cancel : threading.Event or None
+            raises Search_Timeout once it is set
+
+        RETURNS
+        -------
+        best_orientation : int
+            orientation of the best move
+
+        best_col : int
+            leftmost column of the best move
+
+        hold_select : bool
+            whether the hold piece is used
+        """
         # Get hold piece
         if self.hold_piece == "":
             hold_option = self.queue[0]
         else:
             hold_option = self.hold_piece
 
-        # Get number of possible orientations
-        num_states = self.num_piece_states[hold_option]
+        move, root_rows, _ = beam_search(
+            to_bitboard(self.board.board),
+            piece_sequence(self.current_piece, self.queue),
+            self.hold_piece,
+            self.weights,
+            self.beam_width,
+            self.beam_depth,
+            self.table,
+            stats=self.prune_stats,
+            cancel=cancel)
 
-        for states in range(num_states):
-            # Get the piece and the shape of the piece
-            piece = self.piece_shape[hold_option + str(states)]
-            piece_shape = numpy.shape(piece)
+        if move is None:
+            move = (0, 0, False)
 
-            # Calculate the number of places it can go
-            num_moves = int((10 - piece_shape[1]) / 1 + 1)
+        self.commit_move(to_array(root_rows), move[2], hold_option)
+        return move
 
-            for col in range(num_moves):
-                valid_upper, valid_lower, found_valid = self.simulate_piece(
-                    board_copy, piece, piece_shape, max_row, col)
+    def evaluate_parallel(self):
+        """
+        evaluate_beam() with every ply split across a persistent pool of
+        worker processes, see Search_Pool. Plays the same move as
+        evaluate_beam(). The pool is started on the first call.
 
-                if found_valid:
-                    # Place piece on board
-                    board_copy[valid_upper:valid_lower,
-                               col:col + piece_shape[1]] += piece
+        PARAMETERS
+        ----------
+        None
 
-                    H_new, cleared_board = self.calculate_heuristic(
-                        board_copy, max_row)
+        RETURNS
+        -------
+        best_orientation : int
+            orientation of the best move
 
-                    if H_new > H:
-                        H = H_new
-                        best_move = numpy.copy(cleared_board)
-                        best_orientation = states
-                        best_col = col
-                        hold_select = True
+        best_col : int
+            leftmost column of the best move
 
-                    board_copy[valid_upper:valid_lower,
-                               col:col + piece_shape[1]] -= piece
+        hold_select : bool
+            whether the hold piece is used
+        """
+        if self.pool is None:
+            self.pool = Search_Pool(self.workers, self.table_size)
 
+        # Get hold piece
+        if self.hold_piece == "":
+            hold_option = self.queue[0]
+        else:
+            hold_option = self.hold_piece
+
+        move, root_rows, _ = self.pool.search(
+            to_bitboard(self.board.board),
+            piece_sequence(self.current_piece, self.queue),
+            self.hold_piece,
+            self.weights,
+            self.beam_width,
+            self.beam_depth)
+
+        if move is None:
+            move = (0, 0, False)
+
+        self.commit_move(to_array(root_rows), move[2], hold_option)
+        return move
+
+    def evaluate_anytime(self, deadline=None, cancel=None):
+        """
+        Beam search that deepens one piece at a time until the deadline and
+        plays the best move of the deepest completed search. The depth it
+        reached is kept in search_depth.
+
+        PARAMETERS
+        ----------
+        deadline : float or None
+            perf_counter() time by which a move is needed, None searches
+            to beam_depth
+
+        cancel : threading.Event or None
+            stops the deepening once it is set
+
+        RETURNS
+        -------
+        best_orientation : int
+            orientation of the best move
+
+        best_col : int
+            leftmost column of the best move
+
+        hold_select : bool
+            whether the hold piece is used
+        """
+        if deadline is None:
+            return self.evaluate_beam(cancel)
+
+        # Get hold piece
+        if self.hold_piece == "":
+            hold_option = self.queue[0]
+        else:
+            hold_option = self.hold_piece
+
+        move, root_rows, self.search_depth = anytime_search(
+            to_bitboard(self.board.board),
+            piece_sequence(self.current_piece, self.queue),
+            self.hold_piece,
+            self.weights,
+            self.beam_width,
+            deadline,
+            self.table,
+            self.prune_stats,
+            cancel)
+
+        if move is None:
+            move = (0, 0, False)
+
+        self.commit_move(to_array(root_rows), move[2], hold_option)
+        return move
+
+    def commit_move(self, best_move, hold_select, hold_option):
+        """
+        Apply a chosen move to the game state.
+
+        PARAMETERS
+        ----------
+        best_move : numpy.array(float)
+            board after the move, with filled rows cleared
+
+        hold_select : bool
+            whether the hold piece was used
+
+        hold_option : string
+            piece that was placed if the hold piece was used
+
+        RETURNS
+        -------
+        None
+        """
         if hold_select:
             if self.hold_piece == "":
                 self.hold_piece = self.current_piece
@@ -565,7 +1222,6 @@ class Tetris_Game:
 
         self.board.board = best_move
         self.board.update()
-        return best_orientation, best_col, hold_select
 
         """def evaluate_old(self):
         
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+import random
+
+import numpy
+
+from Pieces import *
+
+
+# ---------------------------------------------
+# ZOBRIST KEYS
+#   - One random 64 bit key per cell, a board
+#     hashes to the XOR of the keys of its
+#     filled cells.
+#   - ZOBRIST_ROW[y][mask] is the XOR of the
+#     keys of the cells of a bitboard row, so
+#     numpy boards and bitboards hash the same.
+# ---------------------------------------------
+_rng = random.Random(0x7E7215)
+ZOBRIST_CELL = [[_rng.getrandbits(64) for x in range(10)] for y in range(20)]
+ZOBRIST_ARRAY = numpy.array(ZOBRIST_CELL, dtype=numpy.uint64)
+
+
+def build_row_keys(cell_keys):
+    """
+    Precompute the key of every possible row mask for every row.
+    """
+    row_keys = []
+    for keys in cell_keys:
+        table = [0] * 1024
+        for mask in range(1, 1024):
+            low = mask & -mask
+            table[mask] = table[mask ^ low] ^ keys[low.bit_length() - 1]
+        row_keys.append(table)
+    return row_keys
+
+
+ZOBRIST_ROW = build_row_keys(ZOBRIST_CELL)
+
+
+def zobrist_board(board):
+    """
+    Hash a numpy board from scratch.
+
+    PARAMETERS
+    ----------
+    board : numpy.array(float)
+        board containing game state
+
+    RETURNS
+    -------
+    key : int
+        64 bit Zobrist hash
+    """
+    return int(numpy.bitwise_xor.reduce(ZOBRIST_ARRAY[board > 0]))
+
+
+def zobrist_bits(rows):
+    """
+    Hash a bitboard from scratch.
+    """
+    key = 0
+    for y, row in enumerate(rows):
+        key ^= ZOBRIST_ROW[y][row]
+    return key
+
+
+def zobrist_piece(upper, col, piece_key):
+    """
+    Hash of the cells covered by a placed piece. XOR it into the hash of a
+    board to place or remove the piece.
+
+    PARAMETERS
+    ----------
+    upper : int
+        board row of the top of the piece
+
+    col : int
+        leftmost column of the piece
+
+    piece_key : string
+        piece and orientation, e.g. "T0"
+
+    RETURNS
+    -------
+    key : int
+        XOR of the keys of the covered cells
+    """
+    key = 0
+    for y, x in PIECE_CELLS[piece_key]:
+        key ^= ZOBRIST_CELL[upper + y][col + x]
+    return key
+
+
+def zobrist_masks(top, masks):
+    """
+    zobrist_piece() for a piece given as bitboard row masks.
+    """
+    key = 0
+    for i, mask in enumerate(masks):
+        key ^= ZOBRIST_ROW[top + i][mask]
+    return key
+
+
+class Transposition_Table:
+    """
+    A bounded cache of evaluated boards keyed by Zobrist hash, evicting the
+    least recently used entry when full.
+
+    ATTRIBUTES
+    ----------
+    capacity : int
+        maximum number of entries
+
+    entries : OrderedDict{int : tuple}
+        cached evaluations, least recently used first
+
+    hits : int
+        number of successful lookups
+
+    misses : int
+        number of failed lookups
+
+    METHODS
+    -------
+    get():
+        look up a hash, None if it is not cached
+
+    put():
+        cache an evaluation
+
+    clear():
+        drop every entry and reset the counters
+    """
+
+    def __init__(self, capacity):
+        """
+        PARAMETERS
+        ----------
+        capacity : int
+            maximum number of entries
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Look up a hash.
+
+        PARAMETERS
+        ----------
+        key : int
+            Zobrist hash of the board
+
+        RETURNS
+        -------
+        value : tuple or None
+            cached (H, cleared board, cleared rows) evaluation
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Cache an evaluation, evicting the least recently used if full.
+
+        PARAMETERS
+        ----------
+        key : int
+            Zobrist hash of the board
+
+        value : tuple
+            (H, cleared board, cleared rows) evaluation
+
+        RETURNS
+        -------
+        None
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters.
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,413 @@
+import argparse
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+from timeit import default_timer as timer
+
+import numpy
+
+from Tetris_Game import *
+from Simulator import *
+
+
+# ---------------------------------------------
+# BOARD CORPUS
+#   - Deterministic boards covering the states
+#     the engine sees in a game.
+# ---------------------------------------------
+def make_board(rng, height, fill, holes):
+    """
+    Build a board with a random stack.
+
+    PARAMETERS
+    ----------
+    rng : Random
+        random number generator
+
+    height : int
+        number of rows of the stack
+
+    fill : float
+        chance of each cell of the stack being filled
+
+    holes : bool
+        whether filled cells may float above empty ones, otherwise columns
+        are solid below their top
+
+    RETURNS
+    -------
+    board : numpy.array(uint8)
+        board containing game state
+    """
+    board = numpy.zeros((20, 10), dtype=numpy.uint8)
+    for x in range(10):
+        if holes:
+            for y in range(20 - height, 20):
+                board[y, x] = rng.random() < fill
+        else:
+            top = 20 - rng.randint(max(height - 3, 0), height)
+            board[top:, x] = 1
+    # Never leave a full row, the screen never shows one
+    for y in range(20):
+        if board[y].sum() == 10:
+            board[y, rng.randrange(10)] = 0
+    return board
+
+
+def board_corpus(seed=0):
+    """
+    Realistic boards: empty, mid-game, high stacks and boards full of holes.
+
+    RETURNS
+    -------
+    corpus : dict{string : numpy.array(uint8)}
+        boards by name
+    """
+    rng = random.Random(seed)
+    return {
+        "empty": numpy.zeros((20, 10), dtype=numpy.uint8),
+        "mid_game": make_board(rng, 6, 0.8, False),
+        "high_stack": make_board(rng, 15, 0.8, False),
+        "holes": make_board(rng, 10, 0.7, True)}
+
+
+def make_game(engine, board, beam_depth=3):
+    """
+    Headless Tetris_Game on a corpus board with a fixed set of pieces.
+    """
+    game = Tetris_Game(engine, beam_depth=beam_depth, capture=False,
+                       weights=DEFAULT_WEIGHTS)
+    game.board.board = numpy.copy(board)
+    game.board.update()
+    game.current_piece = "T"
+    game.hold_piece = "I"
+    game.queue = ["S", "Z", "L", "J", "O"]
+    return game
+
+
+def time_call(function, number, repeat):
+    """
+    Best time per call of function, in microseconds.
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) \
+        / number * 1e6
+
+
+# ---------------------------------------------
+# MICRO BENCHMARKS
+#   - Time of one call of each hot path function
+#     on every corpus board, in microseconds.
+# ---------------------------------------------
+def micro_benchmarks(engines, number, repeat):
+    """
+    Time the Board.py helpers, simulate_piece, calculate_heuristic, their
+    Kernels.py versions and evaluate on every corpus board.
+
+    PARAMETERS
+    ----------
+    engines : list[string]
+        search engines to time evaluate with
+
+    number : int
+        calls per timing
+
+    repeat : int
+        timings per benchmark, the best one is kept
+
+    RETURNS
+    -------
+    results : dict{string : float}
+        microseconds per call by "function/board"
+    """
+    results = {}
+    if NUMBA_AVAILABLE:
+        warm_up()
+    weights = numpy.array(DEFAULT_WEIGHTS, dtype=float)
+    for name, board in board_corpus().items():
+        game = make_game("numpy", board)
+        max_row = get_max_height(board)
+        piece = PIECE_SHAPE["T0"]
+
+        benchmarks = {
+            "rows_cleared": lambda: rows_cleared(board, max_row),
+            "find_holes": lambda: find_holes(board),
+            "clear_filled_rows": lambda: clear_filled_rows(
+                numpy.copy(board)),
+            "get_max_height": lambda: get_max_height(board),
+            "get_min_height": lambda: get_min_height(board),
+            "get_roughness": lambda: get_roughness(board),
+            "simulate_piece": lambda: game.simulate_piece(
+                board, piece, numpy.shape(piece), max_row, 4),
+            "calculate_heuristic": lambda: game.calculate_heuristic(
+                board, max_row),
+            "simulate_piece_kernel": lambda: simulate_piece_kernel(
+                board, piece, max_row, 4),
+            "heuristic_kernel": lambda: heuristic_kernel(
+                board, max_row, weights)}
+
+        for function, call in benchmarks.items():
+            results[f"{function}/{name}"] = time_call(call, number, repeat)
+
+        for engine in engines:
+            # evaluate() commits its move, so every call starts from a
+            # fresh game. The game is built outside of the timing
+            games = [make_game(engine, board)
+                     for _ in range(number * repeat)]
+            calls = iter(games)
+            results[f"evaluate_{engine}/{name}"] = time_call(
+                lambda: next(calls).evaluate(), number, repeat)
+            for game in games:
+                if game.pool is not None:
+                    game.pool.shutdown()
+
+    return results
+
+
+# ---------------------------------------------
+# MEMORY BENCHMARKS
+#   - Bytes allocated by one evaluate() call,
+#     measured with tracemalloc.
+# ---------------------------------------------
+# Current and hold pieces from the fewest candidates to the most, from the
+# 9 placements of a lone O to the 68 of a T and an L
+CANDIDATE_PIECES = [("O", "O"), ("O", "I"), ("I", "T"), ("T", "L")]
+
+# Engines that score candidates without allocating per candidate, their
+# peak bytes per decision may not grow with the candidates by more than
+# FLAT_MEMORY_SLACK
+FLAT_MEMORY_ENGINES = ("numpy", "jit")
+FLAT_MEMORY_SLACK = 512
+
+
+def measure_memory(engine, board, decisions, current_piece="T",
+                   hold_piece="I"):
+    """
+    Peak and retained bytes per evaluate() call on a board.
+
+    PARAMETERS
+    ----------
+    engine : string
+        search engine to measure
+
+    board : numpy.array(uint8)
+        corpus board
+
+    decisions : int
+        evaluate() calls, each on a fresh game
+
+    current_piece, hold_piece : string
+        pieces the decisions are made for
+
+    RETURNS
+    -------
+    peak, retained : float
+        bytes per decision
+    """
+    games = [make_game(engine, board) for _ in range(decisions + 1)]
+    for game in games:
+        game.current_piece = current_piece
+        game.hold_piece = hold_piece
+    # The first call pays for one off allocations, e.g. undo frames
+    games[0].evaluate()
+
+    peak = 0
+    retained = 0
+    tracemalloc.start()
+    for game in games[1:]:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        game.evaluate()
+        current, game_peak = tracemalloc.get_traced_memory()
+        peak += game_peak - before
+        retained += current - before
+    tracemalloc.stop()
+
+    for game in games:
+        if game.pool is not None:
+            game.pool.shutdown()
+    return peak / decisions, retained / decisions
+
+
+def memory_benchmarks(engines, decisions):
+    """
+    Measure the peak and retained memory of evaluate() on every corpus
+    board. For FLAT_MEMORY_ENGINES the peak is also measured for every
+    CANDIDATE_PIECES and must stay flat as the number of candidates grows.
+
+    PARAMETERS
+    ----------
+    engines : list[string]
+        search engines to measure
+
+    decisions : int
+        evaluate() calls per engine and board, each on a fresh game
+
+    RETURNS
+    -------
+    results : dict{string : float}
+        bytes per decision by "peak_bytes/engine/board" and
+        "retained_bytes/engine/board", and for FLAT_MEMORY_ENGINES by
+        "peak_bytes/engine/board/pieces" as well
+    """
+    results = {}
+    for name, board in board_corpus().items():
+        for engine in engines:
+            peak, retained = measure_memory(engine, board, decisions)
+            results[f"peak_bytes/{engine}/{name}"] = peak
+            results[f"retained_bytes/{engine}/{name}"] = retained
+
+            if engine not in FLAT_MEMORY_ENGINES:
+                continue
+            peaks = []
+            for current_piece, hold_piece in CANDIDATE_PIECES:
+                peak, _ = measure_memory(engine, board, decisions,
+                                         current_piece, hold_piece)
+                peaks.append(peak)
+                results[f"peak_bytes/{engine}/{name}/"
+                        f"{current_piece}{hold_piece}"] = peak
+            assert max(peaks) <= peaks[0] + FLAT_MEMORY_SLACK, (
+                f"{engine} on {name}: peak bytes per decision grow with "
+                f"the candidates, {[round(peak) for peak in peaks]}")
+    return results
+
+
+# ---------------------------------------------
+# MACRO BENCHMARKS
+#   - Throughput of full headless games.
+# ---------------------------------------------
+def macro_benchmarks(engines, games, max_pieces):
+    """
+    Measure decisions per second and pieces per second through full
+    headless games.
+
+    PARAMETERS
+    ----------
+    engines : list[string]
+        search engines to play with
+
+    games : int
+        games per engine, seeded 0 to games - 1
+
+    max_pieces : int
+        pieces after which a game is stopped
+
+    RETURNS
+    -------
+    results : dict{string : float}
+        decisions per second, pieces per second (including the
+        simulator), lines per piece and share of candidates pruned by
+        their optimistic bound by "metric/engine"
+    """
+    results = {}
+    for engine in engines:
+        game = Tetris_Game(engine, capture=False, weights=DEFAULT_WEIGHTS)
+        pieces = 0
+        lines = 0
+        decision_time = 0
+        tic = timer()
+        for seed in range(games):
+            stats = play_game(game, seed, max_pieces)
+            pieces += stats["pieces"]
+            lines += stats["lines"]
+            decision_time += stats["decision_time"]
+        wall_time = timer() - tic
+        if game.pool is not None:
+            game.pool.shutdown()
+
+        results[f"decisions_per_second/{engine}"] = pieces / decision_time
+        results[f"pieces_per_second/{engine}"] = pieces / wall_time
+        results[f"lines_per_piece/{engine}"] = lines / max(pieces, 1)
+        results[f"pruned_share/{engine}"] = (
+            game.prune_stats.pruned / max(game.prune_stats.candidates, 1))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Find the benchmarks that regressed against a baseline.
+
+    PARAMETERS
+    ----------
+    results : dict{string : dict{string : float}}
+        "micro" timings and "memory" bytes (lower is better) and "macro"
+        rates (higher is better)
+
+    baseline : dict{string : dict{string : float}}
+        results saved by an earlier run
+
+    threshold : float
+        allowed relative slow down, e.g. 0.1 for 10%
+
+    RETURNS
+    -------
+    regressions : list[string]
+        description of every regression
+    """
+    regressions = []
+    for kind in ("micro", "memory", "macro"):
+        for name, value in results.get(kind, {}).items():
+            old = baseline.get(kind, {}).get(name)
+            if old is None or old == 0:
+                continue
+            if kind != "macro":
+                change = value / old - 1
+            else:
+                change = old / value - 1 if value > 0 else float("inf")
+            if change > threshold:
+                regressions.append(
+                    f"{kind} {name}: {old:.4g} -> {value:.4g} "
+                    f"({change:+.1%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the evaluation hot path.")
+    parser.add_argument("--engines", nargs="+",
+                        default=["numpy", "bitboard", "batched", "beam",
+                                 "jit"])
+    parser.add_argument("--number", type=int, default=20,
+                        help="calls per micro benchmark timing")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="timings per micro benchmark")
+    parser.add_argument("--games", type=int, default=5,
+                        help="headless games per engine")
+    parser.add_argument("--max-pieces", type=int, default=200,
+                        help="pieces per headless game")
+    parser.add_argument("--memory", type=int, default=0,
+                        help="decisions per memory benchmark, 0 skips them")
+    parser.add_argument("--save", help="write the results as a baseline")
+    parser.add_argument("--compare", help="baseline to check against")
+    parser.add_argument("--threshold", type=float,
+                        help="allowed relative slow down, defaults to the "
+                             "one saved with the baseline or 0.1")
+    args = parser.parse_args()
+
+    results = {
+        "micro": micro_benchmarks(args.engines, args.number, args.repeat),
+        "macro": macro_benchmarks(args.engines, args.games,
+                                  args.max_pieces)}
+    if args.memory > 0:
+        results["memory"] = memory_benchmarks(args.engines, args.memory)
+
+    for kind, unit in (("micro", "us/call"), ("memory", "B/call"),
+                       ("macro", "")):
+        for name, value in results.get(kind, {}).items():
+            print(f"{kind:5} {name:40} {value:12.3f} {unit}")
+
+    if args.save:
+        results["threshold"] = args.threshold or 0.1
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        threshold = args.threshold or baseline.get("threshold", 0.1)
+        regressions = compare(results, baseline, threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -11,30 +11,7 @@ import win32gui
 from pynput.keyboard import Key, Controller
 import numpy
 
-# Some initial set up of variables and the window
-piece_colour = {}
-piece_colour[166] = "S"
-piece_colour[165] = "S"
-piece_colour[136] = "L"
-piece_colour[152] = "I"
-piece_colour[153] = "I"
-piece_colour[170] = "O"
-piece_colour[171] = "O"
-piece_colour[121] = "T"
-piece_colour[99] = "J"
-piece_colour[98] = "J"
-piece_colour[110] = "Z"
-piece_colour[109] = "Z"
-
-piece_colour[218] = "S"
-piece_colour[180] = "L"
-piece_colour[200] = "I"
-piece_colour[220] = "O"
-piece_colour[161] = "T"
-piece_colour[131] = "J"
-piece_colour[145] = "Z"
-
-
+# Some initial set up of the window
 tetrio = win32gui.FindWindow(None, "TETR.IO")
 win32gui.SetForegroundWindow(tetrio)
 sleep(0.1)
@@ -77,10 +54,12 @@ print(min_row)
 clear_rows = rows_cleared(
     board, max_row)
 
-cleared_board = clear_filled_rows(
-    numpy.copy(board), clear_rows)
+cleared_board = clear_filled_rows(numpy.copy(board))
 
-height_diff = (min_row - max_row) + clear_rows
+# Heights of the cleared board, like Tetris_Game.calculate_heuristic
+max_row = get_max_height(cleared_board)
+min_row = get_min_height(cleared_board)
+height_diff = min_row - max_row
 
 # average_height = get_average_height(cleared_board)
 # print(average_height)
@@ -89,16 +68,16 @@ height_diff = (min_row - max_row) + clear_rows
 
 num_holes = find_holes(cleared_board) # - self.board.number_of_holes)
 
-# Calculate H function
-weights = [2, 3, 4]
-H_new = - weights[0] * height_diff - weights[1] * \
-    num_holes + weights[2] * clear_rows
+roughness = get_roughness(cleared_board)
 
-roughness = get_roughness(board)
+# Calculate H function with the weights Tetris_Game plays with
+weights = load_weights()
+H_new = - weights[0] * height_diff - weights[1] * \
+    num_holes + weights[2] * clear_rows - weights[3] * roughness
 
 print(f"Height difference      : {height_diff}")
 print(f"Number of rows cleared : {clear_rows}")
 print(f"Number of holes        : {num_holes}")
 print(f"Total roughness        : {roughness}")
-print(f"Heuristic H(s) = -{weights[0]}*{height_diff} - {weights[1]}*{num_holes} + {weights[2]}*{clear_rows} = {H_new}")
+print(f"Heuristic H(s) = -{weights[0]}*{height_diff} - {weights[1]}*{num_holes} + {weights[2]}*{clear_rows} - {weights[3]}*{roughness} = {H_new}")
 print()
\ No newline at end of file
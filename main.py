@@ -19,6 +19,7 @@
 #   - Any libraries and imports written by me.
 # ---------------------------------------------
 from Tetris_Game import *
+from Game_Log import *
 
 
 # ---------------------------------------------
@@ -36,6 +37,7 @@ from timeit import default_timer as timer
 import win32gui
 from pynput.keyboard import Key, Controller
 import sys
+import os
 
 
 # ---------------------------------------------
@@ -60,6 +62,11 @@ def ms2frame(t):
     return t * 60
 
 
+# Share of the time budget of each piece (1 / PPS) the anytime engine may
+# spend searching, the rest is left for inputs and capture
+SEARCH_SHARE = 0.8
+
+
 # ---------------------------------------------
 # MAIN FUNCTION
 #   - Contains the juice. Handles init and runs
@@ -74,8 +81,52 @@ def ms2frame(t):
 #   - may add more as needed (like debug...)
 # ---------------------------------------------
 if __name__ == "__main__":
+    # Get AI PPS, the ponder and anytime time budgets depend on it
+    PPS = float(sys.argv[1])
+
+    # Get search backend, the bitboard kernels unless told otherwise
+    if len(sys.argv) > 4:
+        engine = sys.argv[4]
+    else:
+        engine = "bitboard"
+
+    # Get beam search width and depth, trades search quality against PPS
+    if len(sys.argv) > 6:
+        beam_width = int(sys.argv[5])
+        beam_depth = int(sys.argv[6])
+    else:
+        beam_width = 8
+        beam_depth = 3
+
+    # Get number of search processes for the parallel engine
+    if len(sys.argv) > 7:
+        workers = int(sys.argv[7])
+    else:
+        workers = os.cpu_count()
+
+    # Get whether to search the next piece while the current one is typed
+    if "ponder" in sys.argv[8:]:
+        ponder_time = SEARCH_SHARE / PPS
+    else:
+        ponder_time = 0
+
+    # Get whether to capture on a background thread, "async" captures as
+    # fast as possible and "async=<rate>" at a rate per second
+    capture_rate = None
+    for flag in sys.argv[8:]:
+        if flag.startswith("async"):
+            capture_rate = float(flag.partition("=")[2] or 0)
+
+    # Get whether to record per stage latencies, dumped every few seconds
+    if "stats" in sys.argv[8:]:
+        timers = Stage_Timer(True, "debug/stats.txt")
+    else:
+        timers = None
+
     # Create instance of Tetris_Game
-    tetr_board = Tetris_Game()
+    tetr_board = Tetris_Game(engine, beam_width, beam_depth,
+                             workers=workers, ponder_time=ponder_time,
+                             capture_rate=capture_rate, timers=timers)
 
     # Get TETR.IO to be focused window and wait for it to be in focus
     tetrio = win32gui.FindWindow(None, "TETR.IO")
@@ -84,9 +135,6 @@ if __name__ == "__main__":
 
     keyboard = Controller()
 
-    # Get AI PPS
-    PPS = float(sys.argv[1])
-
     # Determine what mode to run in
     mode = sys.argv[2]
     if mode == "loop":
@@ -96,7 +144,8 @@ if __name__ == "__main__":
     else:
         mode = True  # default mode
 
-    debug_file = open("debug/log.txt", "w+")
+    # Binary log of every decision, see Game_Log.py
+    game_log = Game_Log_Writer("debug/log.bin")
 
     # Get whether system is to reset
     if sys.argv[3] == "reset":
@@ -109,21 +158,8 @@ if __name__ == "__main__":
 
     piece_number = 0
 
-    ## DEBUG FILES ##
-    debug_file.write(f"{piece_number},")
-    for row in tetr_board.board.board:
-        for col in row:
-            debug_file.write(f"{col},")
-    debug_file.write(f"{tetr_board.current_piece},")
-    if tetr_board.hold_piece == "":
-        debug_file.write("-,")
-    else:
-        debug_file.write(f"{tetr_board.hold_piece},")
-    for piece in tetr_board.queue:
-        debug_file.write(f"{piece},")
-    debug_file.write(f"{piece_number}\n")
-
     PPS_timer_tic = timer()
+    search_tic = timer()
     while (run_while_true):
         # loop mode
         
@@ -149,8 +185,19 @@ if __name__ == "__main__":
         #   b. Evaluate all possible moves
 
         # 3. Select “best” move
+        #   The anytime engine searches until its share of the time
+        #   budget for this piece is used up, counted from when the
+        #   piece was captured rather than from the start of the wait
+        deadline = search_tic + SEARCH_SHARE / PPS
         #tic = timer()
-        best_or, best_col, hold_select = tetr_board.evaluate()
+        state = snapshot(tetr_board)
+        decision_tic = timer()
+        stage_tic = tetr_board.timers.tic()
+        best_or, best_col, hold_select = tetr_board.evaluate(deadline)
+        tetr_board.timers.toc("evaluate", stage_tic)
+        game_log.write(piece_number, state, (best_or, best_col, hold_select),
+                       timer() - decision_tic)
+        piece_number += 1
         #toc = timer()
         #t = toc - tic
         #iterations += 1
@@ -164,10 +211,14 @@ if __name__ == "__main__":
 
         # 4. For best move, calculate piece movement to make move
         # 5. Generate keyboard inputs
+        stage_tic = tetr_board.timers.tic()
         movement = tetr_board.generate_moves(best_or, best_col, hold_select)
+        tetr_board.timers.toc("generate_moves", stage_tic)
 
         # 6. Execute inputs
+        stage_tic = tetr_board.timers.tic()
         keyboard.type(movement)
+        tetr_board.timers.toc("input", stage_tic)
         # sleep(0.03)
 
         PPS_timer_toc = timer()
@@ -181,48 +232,45 @@ if __name__ == "__main__":
         
         PPS_timer_tic = timer()
 
-        tetr_board.update()
-
-        ## DEBUG FILES ##
-        """piece_number += 1
-        debug_file.write(f"{piece_number},")
-        for row in tetr_board.board.board:
-            for col in row:
-                debug_file.write(f"{col},")
-        debug_file.write(f"{tetr_board.current_piece},")
-        if tetr_board.hold_piece == "":
-            debug_file.write("-,")
-        else:
-            debug_file.write(f"{tetr_board.hold_piece},")
-        for piece in tetr_board.queue:
-            debug_file.write(f"{piece},")
-        debug_file.write(f"{piece_number}\n")"""
+        # The queue stops changing when the game ends
+        try:
+            tetr_board.update()
+        except Queue_Timeout:
+            break
+        search_tic = timer()
 
     else:
         # Single mode
 
+        state = snapshot(tetr_board)
+        decision_tic = timer()
         best_or, best_col, hold_select = tetr_board.evaluate()
+        game_log.write(piece_number, state, (best_or, best_col, hold_select),
+                       timer() - decision_tic)
         movement = tetr_board.generate_moves(best_or, best_col, hold_select)
         keyboard.type(movement)
         sleep(0.025)
-        tetr_board.update()
 
-        ## DEBUG FILES ##
-        piece_number += 1
-        debug_file.write(f"{piece_number},")
-        for row in tetr_board.board.board:
-            for col in row:
-                debug_file.write(f"{col},")
-        debug_file.write(f"{tetr_board.current_piece},")
-        if tetr_board.hold_piece == "":
-            debug_file.write("-,")
-        else:
-            debug_file.write(f"{tetr_board.hold_piece},")
-        for piece in tetr_board.queue:
-            debug_file.write(f"{piece},")
-        debug_file.write("\n")
+        # The queue stops changing when the game ends, clean up regardless
+        try:
+            tetr_board.update()
+        except Queue_Timeout:
+            pass
+
+    game_log.close()
+    if tetr_board.capture_service is not None:
+        tetr_board.capture_service.stop()
+    if tetr_board.pool is not None:
+        tetr_board.pool.shutdown()
 
     tetr_board.print_state()
+    print(tetr_board.prune_stats.summary())
+    if tetr_board.timers.enabled:
+        tetr_board.timers.dump()
+        print(tetr_board.timers.summary())
+        polls = tetr_board.watcher.poll_counts
+        print("Queue polls per piece: "
+              + ", ".join(f"{n}: {polls[n]}" for n in sorted(polls)))
 
 
 # ---------------------------------------------
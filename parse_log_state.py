@@ -1,20 +1,118 @@
-import sys
+import argparse
+import os
 import numpy as np
 from PIL import Image
 from PIL import ImageOps
 
+from Game_Log import *
 
-piece_number = int(sys.argv[1])
 
-log_file = data = open("debug/log.txt","r").read().splitlines()
+def render_board(board, width=500, height=1000):
+    """
+    Render a board as a black and white image.
+    """
+    return Image.fromarray(np.uint8(board * 255)).resize(
+        (width, height), resample=Image.Resampling.BOX)
 
-board_state = log_file[piece_number].split(",")
-board_raw = []
 
-for i in range(1,20*10+1):
-    board_raw.append(float(board_state[i]))
+def render_sprite_sheet(boards, columns=10, width=100, height=200):
+    """
+    Render boards side by side, row by row, in one image.
 
-board = np.asarray(board_raw).reshape([20,10])
+    PARAMETERS
+    ----------
+    boards : numpy.array(float)
+        (n, 20, 10) boards
 
-board_image = Image.fromarray(np.uint8(board*255)).resize((500,1000), resample=Image.Resampling.BOX)
-board_image.save(f"debug/piece{piece_number}.png")
+    columns : int
+        boards per row of the sheet
+
+    width, height : int
+        size of each board in pixels
+
+    RETURNS
+    -------
+    sheet : Image
+        sprite sheet
+    """
+    rows = -(-len(boards) // columns)
+    sheet = np.zeros((rows * 20, columns * 10), dtype=np.uint8)
+    for i, board in enumerate(boards):
+        y, x = divmod(i, columns)
+        sheet[y * 20:(y + 1) * 20, x * 10:(x + 1) * 10] = board * 255
+    return Image.fromarray(sheet).resize(
+        (columns * width, rows * height), resample=Image.Resampling.BOX)
+
+
+def render_gif(boards, path, frame_time=100, width=250, height=500):
+    """
+    Save boards as an animated GIF, one frame per board.
+
+    PARAMETERS
+    ----------
+    boards : numpy.array(float)
+        (n, 20, 10) boards
+
+    path : string
+        file to save the animation to
+
+    frame_time : int
+        milliseconds each board is shown for
+
+    width, height : int
+        size of the animation in pixels
+    """
+    frames = [render_board(board, width, height) for board in boards]
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=frame_time, loop=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render logged boards to images.")
+    parser.add_argument("start", type=int, help="first record to render")
+    parser.add_argument("stop", type=int, nargs="?",
+                        help="record to stop before, only start by default")
+    parser.add_argument("step", type=int, nargs="?", default=1,
+                        help="records between rendered boards")
+    parser.add_argument("--log", help="binary or text log, defaults to "
+                                      "debug/log.bin or debug/log.txt")
+    parser.add_argument("--gif", help="save the boards as an animation")
+    parser.add_argument("--sheet", help="save the boards as a sprite sheet")
+    args = parser.parse_args()
+
+    log_path = args.log
+    if log_path is None:
+        log_path = "debug/log.bin"
+        if not os.path.exists(log_path):
+            log_path = "debug/log.txt"
+
+    stop = args.stop
+    if stop is None:
+        stop = args.start + 1
+
+    # A zero length file cannot be mapped
+    if os.path.getsize(log_path) == 0:
+        parser.error(f"log is empty: {log_path}")
+
+    log = Game_Log_Reader(log_path)
+    if len(log) == 0:
+        log.close()
+        parser.error(f"log is empty: {log_path}")
+    numbers = [record.piece_number
+               for record in log.records(args.start, stop, args.step)]
+    if len(numbers) == 0:
+        count = len(log)
+        log.close()
+        parser.error(f"no records in range {args.start}:{stop}:{args.step}, "
+                     f"the log has {count}")
+    boards = log.boards(args.start, stop, args.step)
+    log.close()
+
+    if args.gif:
+        render_gif(boards, args.gif)
+    if args.sheet:
+        render_sprite_sheet(boards).save(args.sheet)
+    if not args.gif and not args.sheet:
+        for piece_number, board in zip(numbers, boards):
+            render_board(board).save(f"debug/piece{piece_number}.png")
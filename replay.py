@@ -0,0 +1,211 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+from Tetris_Game import *
+from Game_Log import *
+
+
+# ---------------------------------------------
+# WORKER STATE
+#   - Every worker process keeps one headless
+#     game and the open log between chunks.
+# ---------------------------------------------
+_worker_game = None
+_worker_log = None
+
+
+def init_replay_worker(log_path, engine, beam_width, beam_depth, weights):
+    """
+    Set up the headless game and log reader of a worker process.
+    """
+    global _worker_game, _worker_log
+    _worker_game = Tetris_Game(engine, beam_width, beam_depth,
+                               capture=False, weights=weights)
+    _worker_log = Game_Log_Reader(log_path)
+
+
+def replayable(record):
+    """
+    Whether a logged position can be searched: a known current piece and
+    a usable hold and queue.
+    """
+    pieces = [record.current_piece, record.hold_piece] + record.queue
+    return (record.current_piece != ""
+            and UNKNOWN_PIECE not in pieces
+            and "U" not in pieces
+            and "" not in record.queue)
+
+
+def replay_record(game, record):
+    """
+    Decide a logged position again.
+
+    PARAMETERS
+    ----------
+    game : Tetris_Game object
+        headless game making the decision
+
+    record : Log_Record
+        logged position
+
+    RETURNS
+    -------
+    move : tuple(int, int, bool)
+        (orientation, col, hold_select) chosen now
+
+    decision_time : float
+        seconds evaluate() took
+    """
+    board = Board()
+    board.board = record.board
+    board.update()
+    game.load_state(record._replace(board=board))
+
+    tic = timer()
+    orientation, col, hold_select = game.evaluate()
+    return (orientation, col, bool(hold_select)), timer() - tic
+
+
+def replay_chunk(indices):
+    """
+    Replay a chunk of records in a worker process.
+
+    PARAMETERS
+    ----------
+    indices : list[int]
+        records to replay
+
+    RETURNS
+    -------
+    results : list[tuple]
+        (index, piece number, logged move, move, decision time) of every
+        replayable record
+    """
+    results = []
+    for index in indices:
+        record = _worker_log.record(index)
+        if not replayable(record):
+            continue
+        move, decision_time = replay_record(_worker_game, record)
+        results.append((index, record.piece_number, record.move, move,
+                        decision_time))
+    return results
+
+
+def replay(log_path, engine, beam_width, beam_depth, workers,
+           start=None, stop=None, step=None, chunk_size=64,
+           weights=DEFAULT_WEIGHTS):
+    """
+    Replay a range of logged positions across a process pool.
+
+    PARAMETERS
+    ----------
+    log_path : string
+        binary or text log
+
+    engine : string
+        search engine to decide with
+
+    beam_width, beam_depth : int
+        beam search settings
+
+    workers : int
+        worker processes, 1 or less replays in this process
+
+    start, stop, step : int or None
+        records to replay, like a slice
+
+    chunk_size : int
+        records per task
+
+    weights : list[float]
+        heuristic weights to decide with, pinned so a replay does not
+        depend on the weights file
+
+    RETURNS
+    -------
+    results : list[tuple]
+        (index, piece number, logged move, move, decision time) of every
+        replayable record, in log order
+
+    wall_time : float
+        seconds the replay took
+    """
+    log = Game_Log_Reader(log_path)
+    indices = list(range(*slice(start, stop, step).indices(len(log))))
+    log.close()
+    chunks = [indices[i:i + chunk_size]
+              for i in range(0, len(indices), chunk_size)]
+    initargs = (log_path, engine, beam_width, beam_depth, weights)
+
+    tic = timer()
+    if workers <= 1:
+        init_replay_worker(*initargs)
+        chunk_results = [replay_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=init_replay_worker,
+                                 initargs=initargs) as pool:
+            chunk_results = list(pool.map(replay_chunk, chunks))
+    wall_time = timer() - tic
+
+    results = [result for chunk in chunk_results for result in chunk]
+    return results, wall_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Decide logged positions again and compare the moves.")
+    parser.add_argument("log", nargs="?", default="debug/log.bin",
+                        help="binary or text log")
+    parser.add_argument("--engine", default="bitboard")
+    parser.add_argument("--beam-width", type=int, default=8)
+    parser.add_argument("--beam-depth", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--start", type=int)
+    parser.add_argument("--stop", type=int)
+    parser.add_argument("--step", type=int)
+    parser.add_argument("--chunk-size", type=int, default=64,
+                        help="records per worker task")
+    parser.add_argument("--weights",
+                        help="weights file to decide with, the default "
+                             "weights without it")
+    parser.add_argument("--show", type=int, default=20,
+                        help="differing moves to print")
+    parser.add_argument("--strict", action="store_true",
+                        help="exit with 1 when any move differs")
+    args = parser.parse_args()
+
+    weights = DEFAULT_WEIGHTS
+    if args.weights:
+        if not os.path.exists(args.weights):
+            parser.error(f"no weights file {args.weights}")
+        weights = load_weights(args.weights)
+
+    results, wall_time = replay(
+        args.log, args.engine, args.beam_width, args.beam_depth,
+        args.workers, args.start, args.stop, args.step, args.chunk_size,
+        weights)
+
+    decision_time = sum(result[4] for result in results)
+    compared = [result for result in results if result[2] is not None]
+    differing = [result for result in compared if result[2] != result[3]]
+
+    for index, piece_number, logged, move, _ in differing[:args.show]:
+        print(f"record {index:6d} piece {piece_number:6d}: "
+              f"logged {logged} now {move}")
+    if len(differing) > args.show:
+        print(f"... {len(differing) - args.show} more")
+
+    print(f"Decisions           : {len(results)}")
+    print(f"Decisions per second: "
+          f"{len(results) / max(decision_time, 1e-9):.1f} per process, "
+          f"{len(results) / max(wall_time, 1e-9):.1f} overall")
+    print(f"Differing moves     : {len(differing)} of {len(compared)} "
+          f"with a logged move")
+    print(f"Wall time           : {wall_time:.3f} s")
+
+    if args.strict and len(differing) > 0:
+        sys.exit(1)
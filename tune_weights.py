@@ -0,0 +1,430 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+import numpy
+
+from Tetris_Game import *
+from Simulator import *
+
+
+# ---------------------------------------------
+# WORKER STATE
+#   - Every worker process keeps one headless
+#     game, the weights are swapped per task.
+# ---------------------------------------------
+_worker_game = None
+_worker_max_pieces = None
+_worker_garbage_interval = None
+
+
+def init_tune_worker(engine, max_pieces, garbage_interval):
+    """
+    Set up the headless game of a worker process.
+    """
+    global _worker_game, _worker_max_pieces, _worker_garbage_interval
+    _worker_game = Tetris_Game(engine, capture=False,
+                               weights=DEFAULT_WEIGHTS)
+    _worker_max_pieces = max_pieces
+    _worker_garbage_interval = garbage_interval
+
+
+def play_games(weights, seeds):
+    """
+    Play headless games with a set of weights in a worker process.
+
+    PARAMETERS
+    ----------
+    weights : list[float]
+        heuristic weights to play with
+
+    seeds : list[int]
+        seed of the randomiser of every game
+
+    RETURNS
+    -------
+    pieces : list[int]
+        pieces placed in every game before it topped out
+    """
+    _worker_game.set_weights(weights)
+    return [play_game(_worker_game, seed, _worker_max_pieces,
+                      _worker_garbage_interval)["pieces"]
+            for seed in seeds]
+
+
+def evaluate_population(population, seeds, pool, chunk_size):
+    """
+    Score every candidate on the same games.
+
+    PARAMETERS
+    ----------
+    population : numpy.array(float)
+        (candidates, 4) weights
+
+    seeds : list[int]
+        games every candidate plays, common to all of them so they are
+        compared on the same pieces
+
+    pool : ProcessPoolExecutor or None
+        worker processes, None plays in this process
+
+    chunk_size : int
+        games per task
+
+    RETURNS
+    -------
+    fitness : numpy.array(float)
+        mean pieces survived per game of every candidate
+    """
+    tasks = [(index, seeds[i:i + chunk_size])
+             for index in range(len(population))
+             for i in range(0, len(seeds), chunk_size)]
+    weights = [[float(weight) for weight in population[index]]
+               for index, _ in tasks]
+    chunks = [chunk for _, chunk in tasks]
+
+    if pool is None:
+        results = map(play_games, weights, chunks)
+    else:
+        results = pool.map(play_games, weights, chunks)
+
+    pieces = numpy.zeros(len(population))
+    for (index, _), chunk_pieces in zip(tasks, results):
+        pieces[index] += sum(chunk_pieces)
+    return pieces / len(seeds)
+
+
+# ---------------------------------------------
+# FITNESS
+#   - Without pressure any sane weights play
+#     until the piece cap, so every candidate
+#     ties. Garbage rows pushed in from the
+#     bottom end every game eventually and the
+#     fitness is how long a candidate survives.
+#   - A garbage row every 4 pieces lasts about
+#     100 to 300 pieces with good weights and
+#     about 30 with weights that ignore holes.
+# ---------------------------------------------
+def check_fitness(engine="jit", games=8, garbage_interval=4,
+                  max_pieces=None):
+    """
+    Check that the fitness tells clearly different weights apart: the
+    default weights must survive longer than weights that ignore holes
+    and roughness, on the same games.
+
+    RETURNS
+    -------
+    fitness : numpy.array(float)
+        fitness of the default and the careless weights
+    """
+    init_tune_worker(engine, max_pieces, garbage_interval)
+    population = numpy.array([DEFAULT_WEIGHTS, [1, 0, 1, 0]], dtype=float)
+    fitness = evaluate_population(population, list(range(games)), None,
+                                  games)
+    assert fitness[0] > fitness[1], (
+        f"fitness does not separate the weights: {fitness.tolist()}")
+    if max_pieces is not None:
+        assert fitness[0] < max_pieces, (
+            f"fitness saturates at the piece cap: {fitness.tolist()}")
+    return fitness
+
+
+# ---------------------------------------------
+# HELD-OUT GAMES
+#   - Every generation plays new games, so the
+#     best candidate of a generation is partly
+#     the luckiest. A new best has to beat the
+#     old one on a fixed set of games no
+#     generation trains on.
+# ---------------------------------------------
+HOLDOUT_SEED = 2 ** 40
+
+
+def holdout_seeds(seed, games):
+    """
+    Seeds of the held-out games, never drawn by a generation.
+    """
+    return [HOLDOUT_SEED + seed * games + i for i in range(games)]
+
+
+# ---------------------------------------------
+# CROSS ENTROPY METHOD
+#   - Candidates are drawn from a normal
+#     distribution per weight. The best
+#     elite fraction sets the next mean and
+#     standard deviation, plus a little noise
+#     so the search does not collapse early.
+#   - The heuristic subtracts the penalties, so
+#     weights are kept non-negative.
+# ---------------------------------------------
+def sample_population(rng, mean, std, size):
+    """
+    Draw candidates around the mean. The mean itself comes first, so every
+    generation also measures it.
+
+    RETURNS
+    -------
+    population : numpy.array(float)
+        (size, 4) weights
+    """
+    samples = rng.normal(mean, std, (size - 1, len(mean)))
+    return numpy.vstack([mean, numpy.maximum(samples, 0)])
+
+
+def update_distribution(population, fitness, elite, noise):
+    """
+    Fit the distribution to the elite candidates.
+
+    PARAMETERS
+    ----------
+    population : numpy.array(float)
+        (candidates, 4) weights
+
+    fitness : numpy.array(float)
+        fitness of every candidate
+
+    elite : int
+        number of best candidates fitted
+
+    noise : float
+        added to every standard deviation
+
+    RETURNS
+    -------
+    mean, std : numpy.array(float)
+        next distribution
+    """
+    best = population[numpy.argsort(-fitness, kind="stable")[:elite]]
+    return best.mean(axis=0), best.std(axis=0) + noise
+
+
+def load_checkpoint(path):
+    """
+    Load the tuner state saved by save_checkpoint(), None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path, state):
+    """
+    Save the tuner state. The file is replaced in one step, so an
+    interrupted save leaves the previous checkpoint.
+    """
+    with open(path + ".tmp", "w") as checkpoint_file:
+        json.dump(state, checkpoint_file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def tune(generations, population_size, elite_fraction, games, max_pieces,
+         engine, workers, chunk_size, checkpoint_path, output_path,
+         resume=False, seed=0, init_std=1.0, noise=0.1, garbage_interval=4,
+         holdout_games=64):
+    """
+    Tune the heuristic weights by self-play with the cross entropy method.
+
+    PARAMETERS
+    ----------
+    generations : int
+        generations to run, including those of a resumed checkpoint
+
+    population_size : int
+        candidates per generation
+
+    elite_fraction : float
+        share of the best candidates the next distribution is fitted to
+
+    games : int
+        games every candidate plays per generation
+
+    max_pieces : int or None
+        pieces after which a game is stopped, None to play until the
+        stack tops out
+
+    engine : string
+        search engine the games are played with
+
+    workers : int
+        worker processes, 1 or less plays in this process
+
+    chunk_size : int
+        games per task
+
+    checkpoint_path : string
+        tuner state saved after every generation, including the best
+        weights so far
+
+    output_path : string
+        weights file the best candidate is saved to once the last
+        generation is done
+
+    resume : bool
+        whether to continue from checkpoint_path
+
+    seed : int
+        seed of the candidates and the games
+
+    init_std : float
+        initial standard deviation of every weight
+
+    noise : float
+        added to every standard deviation after each generation
+
+    garbage_interval : int
+        pieces between garbage rows, 0 for none, which needs max_pieces
+
+    holdout_games : int
+        held-out games the mean and the best candidate of every generation
+        are rescored on, a new best must beat the old one on them
+
+    RETURNS
+    -------
+    state : dict
+        final tuner state, see save_checkpoint()
+    """
+    state = load_checkpoint(checkpoint_path) if resume else None
+    if state is None:
+        state = {
+            "generation": 0,
+            "mean": [float(weight) for weight in load_weights()],
+            "std": [init_std] * len(DEFAULT_WEIGHTS),
+            "best_weights": None,
+            "best_fitness": None,
+            "best_generation": None,
+            "history": []}
+    elite = max(int(round(population_size * elite_fraction)), 1)
+    holdout = holdout_seeds(seed, holdout_games)
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=init_tune_worker,
+                                   initargs=(engine, max_pieces,
+                                             garbage_interval))
+    else:
+        init_tune_worker(engine, max_pieces, garbage_interval)
+
+    try:
+        while state["generation"] < generations:
+            generation = state["generation"]
+            # Seeded by generation, a resumed run draws the same candidates
+            rng = numpy.random.default_rng([seed, generation])
+            seeds = [seed * 1000003 + generation * games + i
+                     for i in range(games)]
+
+            tic = timer()
+            population = sample_population(
+                rng, numpy.array(state["mean"]), numpy.array(state["std"]),
+                population_size)
+            fitness = evaluate_population(population, seeds, pool,
+                                          chunk_size)
+
+            # Rescore the mean and the best candidate on the held-out
+            # games, the mean comes first so it wins a tie
+            best = int(numpy.argmax(fitness))
+            finalists = population[sorted({0, best})]
+            holdout_fitness = evaluate_population(finalists, holdout, pool,
+                                                  chunk_size)
+            winner = int(numpy.argmax(holdout_fitness))
+            elapsed = timer() - tic
+
+            if (state["best_fitness"] is None
+                    or holdout_fitness[winner] > state["best_fitness"]):
+                state["best_fitness"] = float(holdout_fitness[winner])
+                state["best_weights"] = finalists[winner].tolist()
+                state["best_generation"] = generation
+
+            mean, std = update_distribution(population, fitness, elite,
+                                            noise)
+            state["mean"] = mean.tolist()
+            state["std"] = std.tolist()
+            state["history"].append({
+                "generation": generation,
+                "mean_fitness": float(fitness[0]),
+                "best_fitness": float(fitness[best]),
+                "best_weights": population[best].tolist(),
+                "holdout_fitness": holdout_fitness.tolist(),
+                "seconds": elapsed})
+            state["generation"] = generation + 1
+            save_checkpoint(checkpoint_path, state)
+
+            played = len(population) * games + len(finalists) * len(holdout)
+            print(f"Generation {generation:3d}: "
+                  f"mean {fitness[0]:8.2f} best {fitness[best]:8.2f} "
+                  f"held-out {holdout_fitness[winner]:8.2f} "
+                  f"pieces per game, best weights "
+                  f"{numpy.round(population[best], 3).tolist()}, "
+                  f"{played / elapsed:.1f} games/s")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Only a finished run replaces the weights file, an interrupted one
+    # keeps its progress in the checkpoint
+    if state["best_weights"] is not None:
+        save_weights(state["best_weights"], output_path,
+                     fitness=state["best_fitness"],
+                     generation=state.get("best_generation"),
+                     games=games, holdout_games=holdout_games,
+                     max_pieces=max_pieces,
+                     garbage_interval=garbage_interval, engine=engine)
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Tune the heuristic weights by self-play.")
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--population", type=int, default=32,
+                        help="candidates per generation")
+    parser.add_argument("--elite", type=float, default=0.25,
+                        help="share of candidates the next generation is "
+                             "fitted to")
+    parser.add_argument("--games", type=int, default=32,
+                        help="games per candidate per generation")
+    parser.add_argument("--max-pieces", type=int,
+                        help="stop games after this many pieces, by default "
+                             "they run until the stack tops out")
+    parser.add_argument("--garbage-interval", type=int, default=4,
+                        help="pieces between garbage rows, 0 for none")
+    parser.add_argument("--engine", default="jit")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=4,
+                        help="games per worker task")
+    parser.add_argument("--checkpoint", default="tune_checkpoint.json")
+    parser.add_argument("--output", default=WEIGHTS_PATH,
+                        help="weights file Tetris_Game loads, written once "
+                             "the last generation is done")
+    parser.add_argument("--holdout-games", type=int, default=64,
+                        help="held-out games a new best weights must win on")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the checkpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--init-std", type=float, default=1.0)
+    parser.add_argument("--noise", type=float, default=0.1)
+    parser.add_argument("--check", action="store_true",
+                        help="only check that the fitness separates good "
+                             "and careless weights")
+    args = parser.parse_args()
+    if args.garbage_interval <= 0 and args.max_pieces is None:
+        parser.error("games without garbage need --max-pieces")
+
+    if args.check:
+        fitness = check_fitness(args.engine, args.games,
+                                args.garbage_interval, args.max_pieces)
+        print(f"Fitness separates the weights: {fitness.tolist()}")
+        sys.exit(0)
+
+    state = tune(args.generations, args.population, args.elite, args.games,
+                 args.max_pieces, args.engine, args.workers, args.chunk_size,
+                 args.checkpoint, args.output, args.resume, args.seed,
+                 args.init_std, args.noise, args.garbage_interval,
+                 args.holdout_games)
+
+    print(f"Best weights        : {state['best_weights']}")
+    print(f"Held-out pieces     : {state['best_fitness']:.2f}")
+    print(f"Saved to            : {args.output}")